@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+
+### Store release files once, by their checksum.
+###
+### Many releases publish files with the same contents, e.g. when a file is
+### unchanged between a release candidate and the stable release. The store
+### keeps a single copy of each file, named after its SHA-512 checksum:
+###   objects/<first 2 hex digits>/<128 hex digits>
+###
+### ingest:      copies downloaded files of a release into the store, and
+###              checks each one against the checksum in its metadata file.
+### materialize: creates the folder of a release from the store, using hard
+###              links, or reflinks, or copies if neither is supported.
+###              .NET files go to a mono/ subfolder, like on the mirror.
+### gc:          removes objects which no release metadata refers to.
+### stats:       prints how much space the store takes and saves.
+###
+### Objects are made read-only, as hard links share them with every release
+### folder they appear in. Files in release folders must never be edited in
+### place, only replaced.
+###
+### Usage: ./artifact_store.py ingest -r 4.3-stable -d ./downloads/4.3-stable
+### Usage: ./artifact_store.py materialize -r 4.3-stable -o ./mirror/4.3
+### Usage: ./artifact_store.py gc --dry-run
+
+
+import argparse
+import errno
+import hashlib
+import os
+import re
+import shutil
+import stat
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where reflinks are not supported.
+    fcntl = None
+
+from release_assets import classify_file
+from release_loader import DEFAULT_RELEASES_PATH, get_release_path, load_release, load_releases
+
+
+DEFAULT_STORE_PATH = "./tmp/store"
+
+STORE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Temporary files of ingests are named after the process writing them.
+INGEST_TEMP_RE = re.compile(r"ingest-(\d+)-.*\.tmp")
+# Temporary files older than this are removed even if their process seems alive, as its id may have been reused.
+INGEST_TEMP_MAX_AGE = 24 * 60 * 60
+
+# From linux/fs.h, clones the contents of a file on filesystems like Btrfs and XFS.
+FICLONE = 0x40049409
+
+LINK_MODES = ["auto", "hardlink", "reflink", "copy"]
+
+# Files published with each release which are not listed in its metadata.
+IGNORED_FILENAMES = [
+    "README.txt",
+    "SHA512-SUMS.txt",
+]
+
+
+class StoreError(Exception):
+    pass
+
+
+def get_object_path(store_path: str, checksum: str) -> str:
+    return os.path.join(store_path, "objects", checksum[:2], checksum)
+
+
+def get_release_file_path(release_folder: str, filename: str) -> str:
+    asset = classify_file(filename)
+    if asset is not None and asset[2] == "mono":
+        return os.path.join(release_folder, "mono", filename)
+    return os.path.join(release_folder, filename)
+
+
+# Ingesting.
+
+def get_ingest_temp_path(store_path: str, file_path: str) -> str:
+    return os.path.join(store_path, "objects", f"ingest-{os.getpid()}-{os.path.basename(file_path)}.tmp")
+
+
+def is_process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # os.kill() would terminate the process on Windows, only the age of temporary files is checked there.
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user.
+        return True
+    return True
+
+
+def is_stale_temp_file(entry) -> bool:
+    # Temporary files of ingests which are still running must be kept.
+    if time.time() - entry.stat().st_mtime > INGEST_TEMP_MAX_AGE:
+        return True
+
+    match = INGEST_TEMP_RE.fullmatch(entry.name)
+    return match is not None and not is_process_alive(int(match.group(1)))
+
+
+def ingest_file(store_path: str, file_path: str, expected_checksums) -> str:
+    # Returns the checksum of the file, or raises StoreError if it's not one of the expected ones.
+    # The file is hashed while it's copied, so it's only read once.
+    temp_path = get_ingest_temp_path(store_path, file_path)
+    if not os.path.exists(os.path.dirname(temp_path)):
+        os.makedirs(os.path.dirname(temp_path))
+
+    checksum = hashlib.sha512()
+    buffer = bytearray(STORE_CHUNK_SIZE)
+    view = memoryview(buffer)
+    try:
+        with open(file_path, 'rb', buffering=0) as src, open(temp_path, 'wb') as dst:
+            while True:
+                read_size = src.readinto(buffer)
+                if not read_size:
+                    break
+                checksum.update(view[:read_size])
+                dst.write(view[:read_size])
+
+        file_checksum = checksum.hexdigest()
+        if file_checksum not in expected_checksums:
+            raise StoreError("Checksum doesn't match the release metadata.")
+
+        object_path = get_object_path(store_path, file_checksum)
+        if not os.path.exists(os.path.dirname(object_path)):
+            os.makedirs(os.path.dirname(object_path))
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, object_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return file_checksum
+
+
+def ingest_release(store_path: str, release, release_folder: str):
+    # Returns a summary with lists of stored, existing, failed, missing, and extra files.
+    expected_checksums = {}
+    for file in release.files:
+        expected_checksums.setdefault(file.filename, set()).add(file.checksum)
+
+    summary = {
+        "stored": [],
+        "existing": [],
+        "failed": [],
+        "missing": [],
+        "extra": [],
+    }
+
+    found_filenames = set()
+    for dirpath, _, filenames in os.walk(release_folder):
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            if filename not in expected_checksums:
+                if filename not in IGNORED_FILENAMES:
+                    summary["extra"].append(file_path)
+                continue
+
+            found_filenames.add(filename)
+
+            # Files already in the store were checked when they were ingested, so they're skipped without reading them.
+            if all(os.path.exists(get_object_path(store_path, checksum)) for checksum in expected_checksums[filename]):
+                summary["existing"].append(file_path)
+                continue
+
+            try:
+                ingest_file(store_path, file_path, expected_checksums[filename])
+                summary["stored"].append(file_path)
+            except (OSError, StoreError) as e:
+                summary["failed"].append(f"{file_path}: {e}")
+
+    summary["missing"] = sorted(filename for filename in expected_checksums if filename not in found_filenames)
+    return summary
+
+
+# Materializing.
+
+def reflink_file(src_path: str, dst_path: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_file(src_path: str, dst_path: str, link_modes) -> str:
+    # Tries each mode in order and returns the one which worked. Modes which fail are removed
+    # from the list, e.g. hard links when the release folder is on another filesystem than
+    # the store, so they're not tried again for every file.
+    while link_modes:
+        link_mode = link_modes[0]
+        try:
+            if link_mode == "hardlink":
+                os.link(src_path, dst_path)
+            elif link_mode == "reflink":
+                reflink_file(src_path, dst_path)
+            else:
+                shutil.copyfile(src_path, dst_path)
+            return link_mode
+        except OSError:
+            if os.path.exists(dst_path):
+                os.remove(dst_path)
+            if len(link_modes) == 1:
+                raise
+            link_modes.pop(0)
+
+
+def materialize_release(store_path: str, release, release_folder: str, link_mode: str = "auto"):
+    # Returns a summary with lists of created, existing, and missing files, and the link modes used.
+    summary = {
+        "created": [],
+        "existing": [],
+        "missing": [],
+        "modes": {},
+    }
+
+    link_modes = ["hardlink", "reflink", "copy"] if link_mode == "auto" else [link_mode]
+    seen_paths = set()
+    for file in release.files:
+        file_path = get_release_file_path(release_folder, file.filename)
+        object_path = get_object_path(store_path, file.checksum)
+
+        # Releases can list the same file for both standard and .NET builds, the first one wins.
+        if file_path in seen_paths:
+            continue
+        seen_paths.add(file_path)
+
+        try:
+            object_stat = os.stat(object_path)
+        except FileNotFoundError:
+            summary["missing"].append(file.filename)
+            continue
+
+        # Hard links from a previous run point to the object already.
+        try:
+            if os.path.samestat(os.stat(file_path), object_stat):
+                summary["existing"].append(file_path)
+                continue
+        except FileNotFoundError:
+            pass
+
+        file_dir = os.path.dirname(file_path)
+        if not os.path.exists(file_dir):
+            os.makedirs(file_dir)
+
+        # Links are created next to the target first, so existing files are replaced in one go.
+        temp_path = f"{file_path}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        used_mode = link_file(object_path, temp_path, link_modes)
+        os.replace(temp_path, file_path)
+
+        summary["created"].append(file_path)
+        summary["modes"][used_mode] = summary["modes"].get(used_mode, 0) + 1
+
+    return summary
+
+
+# Garbage collection.
+
+def find_objects(store_path: str):
+    # Yields (checksum, path) pairs of all objects in the store.
+    objects_path = os.path.join(store_path, "objects")
+    if not os.path.isdir(objects_path):
+        return
+
+    for prefix_entry in os.scandir(objects_path):
+        if not prefix_entry.is_dir():
+            continue
+        for entry in os.scandir(prefix_entry.path):
+            yield entry.name, entry.path
+
+
+def get_referenced_checksums(releases_path: str):
+    checksums = set()
+    for release in load_releases(releases_path):
+        files = release.files
+        for index in range(len(files)):
+            checksums.add(files.get_digest(index).hex())
+        release.unload_files()
+
+    return checksums
+
+
+def collect_garbage(store_path: str, releases_path: str, dry_run: bool = False):
+    # Returns the removed object paths and their total size.
+    referenced_checksums = get_referenced_checksums(releases_path)
+
+    removed_paths = []
+    removed_size = 0
+    for checksum, object_path in find_objects(store_path):
+        if checksum in referenced_checksums:
+            continue
+
+        removed_paths.append(object_path)
+        removed_size += os.path.getsize(object_path)
+        if not dry_run:
+            os.remove(object_path)
+
+    # Leftovers of interrupted ingests are also removed.
+    objects_path = os.path.join(store_path, "objects")
+    if os.path.isdir(objects_path):
+        for entry in os.scandir(objects_path):
+            try:
+                if not entry.is_file() or not entry.name.endswith(".tmp") or not is_stale_temp_file(entry):
+                    continue
+                temp_size = entry.stat().st_size
+                if not dry_run:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # Finished or removed in the meantime.
+                continue
+
+            removed_paths.append(entry.path)
+            removed_size += temp_size
+
+    return removed_paths, removed_size
+
+
+def get_store_stats(store_path: str, releases_path: str):
+    object_sizes = {}
+    for checksum, object_path in find_objects(store_path):
+        object_sizes[checksum] = os.path.getsize(object_path)
+
+    # Logical size is what the release folders would take if every file was stored separately.
+    logical_size = 0
+    referenced_count = 0
+    for release in load_releases(releases_path):
+        for file in release.files:
+            size = object_sizes.get(file.checksum)
+            if size is not None:
+                logical_size += size
+                referenced_count += 1
+        release.unload_files()
+
+    return {
+        "objects": len(object_sizes),
+        "stored_size": sum(object_sizes.values()),
+        "references": referenced_count,
+        "logical_size": logical_size,
+    }
+
+
+# Main routine.
+
+def load_named_release(releases_path: str, release_name: str, action: str):
+    release_path = get_release_path(releases_path, release_name)
+    if not os.path.isfile(release_path):
+        print(f"Failed to {action}: Cannot find release metadata at '{release_path}'.\n")
+        exit(1)
+
+    return load_release(release_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--store", default=DEFAULT_STORE_PATH, help=f"Path to the artifact store (defaults to {DEFAULT_STORE_PATH}).")
+    parser.add_argument("--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Copy files of a release into the store.")
+    ingest_parser.add_argument("-r", "--release", required=True, help="Release to ingest files of, e.g. 4.3-stable or 4.4-beta1.")
+    ingest_parser.add_argument("-d", "--dir", required=True, help="Folder with the release files, including its mono/ subfolder.")
+
+    materialize_parser = subparsers.add_parser("materialize", help="Create the folder of a release from the store.")
+    materialize_parser.add_argument("-r", "--release", required=True, help="Release to create the folder of, e.g. 4.3-stable or 4.4-beta1.")
+    materialize_parser.add_argument("-o", "--output", required=True, help="Path to the release folder.")
+    materialize_parser.add_argument("-m", "--mode", default="auto", choices=LINK_MODES, help="How files are created: hard links, reflinks, or copies (defaults to auto, which tries them in that order).")
+
+    gc_parser = subparsers.add_parser("gc", help="Remove objects which no release refers to.")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only print the objects which would be removed.")
+
+    subparsers.add_parser("stats", help="Print the size of the store and the space saved by deduplication.")
+
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        if not os.path.isdir(args.dir):
+            print(f"Failed to ingest release files: Cannot find the release folder at '{args.dir}'.\n")
+            exit(1)
+
+        release = load_named_release(args.releases, args.release, "ingest release files")
+        summary = ingest_release(args.store, release, args.dir)
+        for message in summary["failed"]:
+            print(f"FAILED: {message}")
+        for filename in summary["missing"]:
+            print(f"MISSING: {filename}")
+        for file_path in summary["extra"]:
+            print(f"EXTRA: {file_path}")
+
+        print(
+            f"Ingested files of release '{release.name}': {len(summary['stored'])} stored, "
+            f"{len(summary['existing'])} already in the store, {len(summary['failed'])} failed, "
+            f"{len(summary['missing'])} missing, {len(summary['extra'])} extra."
+        )
+        if summary["failed"]:
+            exit(1)
+        return
+
+    if args.command == "materialize":
+        release = load_named_release(args.releases, args.release, "materialize release")
+        try:
+            summary = materialize_release(args.store, release, args.output, args.mode)
+        except OSError as e:
+            print(f"Failed to materialize release: {e}\n")
+            exit(1)
+
+        for filename in summary["missing"]:
+            print(f"MISSING: {filename}")
+
+        modes = ", ".join(f"{count} {mode}" for mode, count in sorted(summary["modes"].items())) or "none"
+        print(
+            f"Materialized release '{release.name}' in '{args.output}': {len(summary['created'])} created ({modes}), "
+            f"{len(summary['existing'])} up to date, {len(summary['missing'])} missing from the store."
+        )
+        if summary["missing"]:
+            exit(1)
+        return
+
+    if args.command == "gc":
+        removed_paths, removed_size = collect_garbage(args.store, args.releases, args.dry_run)
+        for object_path in removed_paths:
+            print(f"{'UNUSED' if args.dry_run else 'REMOVED'}: {object_path}")
+
+        action = "Would remove" if args.dry_run else "Removed"
+        print(f"{action} {len(removed_paths)} unused objects ({removed_size} bytes).")
+        return
+
+    stats = get_store_stats(args.store, args.releases)
+    print(f"Objects: {stats['objects']} ({stats['stored_size']} bytes)")
+    print(f"References from releases: {stats['references']} ({stats['logical_size']} bytes)")
+    print(f"Saved by deduplication: {stats['logical_size'] - stats['stored_size']} bytes")
+
+
+if __name__ == "__main__":
+    main()
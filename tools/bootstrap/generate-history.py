@@ -11,13 +11,70 @@
 ### Make sure you do not rebase or otherwise change the history
 ### afterwards, as that destroys git tags (they remain assigned
 ### to old commits).
+###
+### With --fast-import all commits and tags are streamed into a single
+### git fast-import session instead of running several git commands for
+### each release. The history is appended to the current branch.
 
 
+import argparse
 import json
 import os
 import subprocess
+import sys
 from datetime import datetime
 
+# Shared modules live in the tools folder, one level up.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import metrics
+
+
+# Helpers.
+
+def run_git(*git_args):
+    result = subprocess.run(["git", *git_args], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def format_data(data):
+    return f"data {len(data)}\n".encode() + data + b"\n"
+
+
+def generate_fast_import(releases, branch_ref, parent_commit, identity):
+    repository_root = run_git("rev-parse", "--show-toplevel")
+
+    for mark, release_data in enumerate(releases, start=1):
+        release_tag = f"{release_data['data']['version']}-{release_data['data']['status']}"
+        release_path = os.path.relpath(os.path.abspath(release_data['file']), repository_root).replace(os.sep, "/")
+        # Spoof both author and committer dates to match the release date.
+        signature = f"{identity} {release_data['data']['release_date']} +0000"
+
+        with open(release_data['file'], 'rb') as release_file:
+            release_contents = release_file.read()
+        metrics.count("fast_import", bytes_read=len(release_contents), files=1)
+
+        yield f"commit {branch_ref}\nmark :{mark}\nauthor {signature}\ncommitter {signature}\n".encode()
+        yield format_data(f"Add Godot {release_tag}\n".encode())
+        if mark > 1:
+            yield f"from :{mark - 1}\n".encode()
+        elif parent_commit:
+            yield f"from {parent_commit}\n".encode()
+        yield f"M 100644 inline {release_path}\n".encode()
+        yield format_data(release_contents)
+
+        yield f"reset refs/tags/{release_tag}\nfrom :{mark}\n\n".encode()
+
+        print(f"Committed release '{release_data['data']['name']}'.")
+
+
+# Main routine.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--fast-import", action="store_true", help="Create all commits and tags in a single git fast-import session.")
+metrics.add_metrics_arguments(parser)
+args = parser.parse_args()
+
+metrics.start_metrics("generate-history", args)
 
 releases = []
 
@@ -25,20 +82,22 @@ releases = []
 
 releases_path = "./releases"
 
-dir_contents = os.listdir(releases_path)
-for filename in dir_contents:
-    filepath = os.path.join(releases_path, filename)
-    if not os.path.isfile(filepath):
-        continue
+with metrics.stage("read_releases"):
+    dir_contents = os.listdir(releases_path)
+    for filename in dir_contents:
+        filepath = os.path.join(releases_path, filename)
+        if not os.path.isfile(filepath):
+            continue
 
-    with open(filepath, 'r') as json_data:
-        release_data = json.load(json_data)
+        with open(filepath, 'r') as json_data:
+            release_data = json.load(json_data)
+        metrics.count("read_releases", bytes_read=os.path.getsize(filepath), files=1)
 
-    print(f"Reading release '{release_data['name']}' data.")
-    releases.append({
-        "file": filepath,
-        "data": release_data
-    })
+        print(f"Reading release '{release_data['name']}' data.")
+        releases.append({
+            "file": filepath,
+            "data": release_data
+        })
 
 # Sort by release date so we can create commits in order
 releases.sort(key=lambda x: x['data']['release_date'])
@@ -46,6 +105,27 @@ releases.sort(key=lambda x: x['data']['release_date'])
 # Generate a commit for each release, spoof the commit date to
 # match the release date.
 
+if args.fast_import:
+    branch_name = run_git("symbolic-ref", "--short", "HEAD") or "main"
+    parent_commit = run_git("rev-parse", "--verify", "--quiet", "HEAD")
+    identity = f"{run_git('config', 'user.name')} <{run_git('config', 'user.email')}>"
+
+    with metrics.stage("fast_import"):
+        fast_import = subprocess.Popen(["git", "fast-import", "--quiet"], stdin=subprocess.PIPE)
+        for chunk in generate_fast_import(releases, f"refs/heads/{branch_name}", parent_commit, identity):
+            fast_import.stdin.write(chunk)
+            metrics.count("fast_import", bytes_written=len(chunk))
+        fast_import.stdin.close()
+        fast_import_status = fast_import.wait()
+
+    if fast_import_status != 0:
+        print("Failed to import the release history with git fast-import.")
+        exit(1)
+
+    # Commits were created without touching the index, so bring it up to date with the new branch head.
+    subprocess.run(["git", "reset", "--quiet"])
+    exit(0)
+
 for release_data in releases:
     commit_datetime = datetime.fromtimestamp(release_data['data']['release_date'])
     # Thu, 07 Apr 2005 22:13:13 +0200
@@ -60,9 +140,11 @@ for release_data in releases:
     extra_env = os.environ.copy()
     extra_env['GIT_COMMITTER_DATE'] = commit_date
 
-    subprocess.run(cmd_add_file)
-    subprocess.run(cmd_commit_release, env=extra_env)
-    subprocess.run(cmd_amend_time, env=extra_env)
-    subprocess.run(cmd_tag_release, env=extra_env)
+    with metrics.stage("commit"):
+        subprocess.run(cmd_add_file)
+        subprocess.run(cmd_commit_release, env=extra_env)
+        subprocess.run(cmd_amend_time, env=extra_env)
+        subprocess.run(cmd_tag_release, env=extra_env)
+    metrics.count("commit", files=1)
 
     print(f"Committed release '{release_data['data']['name']}'.")
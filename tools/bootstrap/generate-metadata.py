@@ -7,15 +7,42 @@
 ### the data we extract dates and commit hashes from releases published
 ### on TuxFamily. We also extract SHA512 checksums for release files
 ### where possible.
-
-
+###
+### Pages are fetched concurrently over a pool of keep-alive connections,
+### with failed requests retried after an increasing delay. Use --url to
+### crawl a different mirror, e.g. a local stand-in for testing.
+###
+### Responses are cached in tmp/http-cache along with their ETag and
+### Last-Modified headers. Re-running the script sends conditional requests
+### and reuses unchanged pages from disk. With --offline the script only
+### replays the cache, without making any requests.
+###
+### Directory listings are parsed incrementally while they are downloaded,
+### so looking up a release date stops at the first matching entry.
+
+
+import argparse
+import codecs
+import collections
+import contextlib
+import hashlib
+import html.parser
+import http.client
+import json
 import os
-import urllib.request
-import urllib.error
 import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-url = 'https://downloads.tuxfamily.org/godotengine/'
+# Shared modules live in the tools folder, one level up.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import metrics
+
+default_url = 'https://downloads.tuxfamily.org/godotengine/'
 skip_versions = [
     "2.1.1-fixup",
     "2.1.7-rc",
@@ -34,6 +61,332 @@ missing_hashes = {
     "3.1-alpha1": "2881a8e431308647fde21f9744b81269d0323922",
 }
 
+# HTTP client.
+
+HTTP_CHUNK_SIZE = 16 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} for '{url}'")
+        self.url = url
+        self.status = status
+
+
+class HttpCache:
+    # Each URL is stored as two files named after its hash: the response body,
+    # and a JSON file with the status code and validators sent by the server.
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_path, exist_ok=True)
+
+    def _get_paths(self, url):
+        url_hash = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_path, f"{url_hash}.json"), os.path.join(self.cache_path, f"{url_hash}.body")
+
+    def _get_temp_path(self, path):
+        # Workers may store the same URL at the same time, so each uses its own temporary file.
+        return f"{path}.{threading.get_ident()}.tmp"
+
+    def load(self, url):
+        meta_path, body_path = self._get_paths(url)
+        try:
+            with open(meta_path, 'r') as meta_file:
+                entry = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("status") == 200 and not os.path.isfile(body_path):
+            return None
+
+        return entry
+
+    def read_body(self, url):
+        _, body_path = self._get_paths(url)
+        with open(body_path, 'rb') as body_file:
+            while True:
+                chunk = body_file.read(HTTP_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def open_body(self, url):
+        _, body_path = self._get_paths(url)
+        return open(self._get_temp_path(body_path), 'wb')
+
+    def store(self, url, status, headers=None, body_file=None):
+        meta_path, body_path = self._get_paths(url)
+        entry = {
+            "url": url,
+            "status": status,
+            "etag": headers.get("ETag") if headers else None,
+            "last_modified": headers.get("Last-Modified") if headers else None,
+        }
+
+        # The body goes first, so that metadata never points to a missing or outdated body.
+        if body_file is not None:
+            body_file.close()
+            os.replace(body_file.name, body_path)
+
+        temp_path = self._get_temp_path(meta_path)
+        with open(temp_path, 'w') as meta_file:
+            json.dump(entry, meta_file)
+        os.replace(temp_path, meta_path)
+
+    def discard_body(self, body_file):
+        body_file.close()
+        os.remove(body_file.name)
+
+
+class HttpClient:
+    # Each worker thread keeps its own keep-alive connection per host, so the pool
+    # of connections grows with the number of workers and is reused across requests.
+
+    def __init__(self, retries=4, backoff=0.5, timeout=30, cache=None, offline=False):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = offline
+        self._local = threading.local()
+
+    def _get_connection(self, host):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        connection = connections.get(host)
+        if connection is None:
+            scheme, netloc = host
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            connections[host] = connection
+
+        return connection
+
+    def _drop_connection(self, host, connection=None):
+        # Drops the thread's connection to the host, or the given connection. Unfinished streams
+        # can be closed from another thread, or after their connection was replaced already.
+        connections = getattr(self._local, "connections", {})
+        if connection is None or connections.get(host) is connection:
+            connection = connections.pop(host, None)
+        if connection is not None:
+            # Responses still being read from it are cut short, see stream().
+            connection.dropped = True
+            connection.close()
+
+    def _wait_before_retry(self, attempt):
+        time.sleep(self.backoff * (2 ** attempt))
+
+    def _open(self, url, headers, redirects=5):
+        # Returns the host, the connection, and the response with its body not read yet.
+        parsed_url = urllib.parse.urlsplit(url)
+        host = (parsed_url.scheme, parsed_url.netloc)
+        request_path = parsed_url.path or "/"
+        if parsed_url.query:
+            request_path += f"?{parsed_url.query}"
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                self._wait_before_retry(attempt - 1)
+
+            try:
+                connection = self._get_connection(host)
+                connection.request("GET", request_path, headers={ "User-Agent": "godot-builds-bootstrap", **headers })
+                response = connection.getresponse()
+
+                if response.status in [301, 302, 303, 307, 308] or response.status == 429 or response.status >= 500:
+                    response.read()
+            except (http.client.HTTPException, OSError):
+                # The server may have closed the keep-alive connection, try again with a new one.
+                self._drop_connection(host)
+                continue
+
+            if response.status in [301, 302, 303, 307, 308] and redirects > 0:
+                if response.will_close:
+                    self._drop_connection(host)
+                location = response.getheader("Location")
+                if not location:
+                    raise HttpError(url, f"{response.status} without a Location header")
+                return self._open(urllib.parse.urljoin(url, location), headers, redirects - 1)
+            if response.status == 429 or response.status >= 500:
+                if response.will_close:
+                    self._drop_connection(host)
+                continue
+
+            return host, connection, response
+
+        raise HttpError(url, "retries exhausted")
+
+    def stream(self, url):
+        # Yields the response body in chunks, so pages can be processed while they arrive.
+        entry = None
+        if self.cache:
+            entry = self.cache.load(url)
+
+        if self.offline:
+            if entry is None:
+                raise HttpError(url, "not cached")
+            if entry["status"] != 200:
+                raise HttpError(url, entry["status"])
+            metrics.count("http_cached", files=1)
+            yield from self.cache.read_body(url)
+            return
+
+        # Ask the server to only send the page if it changed since we cached it.
+        headers = {}
+        if entry and entry["status"] == 200:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Measures the time until response headers arrive, bodies are counted as they are read.
+        with metrics.stage("http_request"):
+            host, connection, response = self._open(url, headers)
+        metrics.count("http_request", files=1)
+
+        if response.status != 200:
+            try:
+                response.read()
+            except (http.client.HTTPException, OSError):
+                self._drop_connection(host, connection)
+            if response.will_close:
+                self._drop_connection(host, connection)
+
+            if response.status == 304 and entry and entry["status"] == 200:
+                metrics.count("http_cached", files=1)
+                yield from self.cache.read_body(url)
+                return
+            if self.cache and 400 <= response.status < 500:
+                self.cache.store(url, response.status)
+            raise HttpError(url, response.status)
+
+        body_file = None
+        if self.cache:
+            body_file = self.cache.open_body(url)
+
+        completed = False
+        try:
+            while True:
+                chunk = response.read(HTTP_CHUNK_SIZE)
+                if not chunk:
+                    break
+                metrics.count("http_request", bytes_read=len(chunk))
+                if body_file:
+                    body_file.write(chunk)
+                yield chunk
+
+            # If the connection was dropped while the consumer was suspended, e.g. by another
+            # request from the same thread, reads end early and the page is incomplete.
+            completed = not getattr(connection, "dropped", False)
+        finally:
+            # When the consumer stops early, the rest of the page still has to be read to
+            # keep the connection usable. It's only worth it if the page is cached, though.
+            if not completed and body_file and not getattr(connection, "dropped", False):
+                try:
+                    remaining_body = response.read()
+                    body_file.write(remaining_body)
+                    completed = True
+                except (http.client.HTTPException, OSError):
+                    pass
+
+            if not completed or response.will_close:
+                self._drop_connection(host, connection)
+
+            if body_file:
+                if completed:
+                    self.cache.store(url, response.status, response.headers, body_file)
+                else:
+                    self.cache.discard_body(body_file)
+
+    def fetch(self, url):
+        for attempt in range(self.retries + 1):
+            try:
+                return b"".join(self.stream(url))
+            except (http.client.HTTPException, OSError):
+                # The connection broke while reading the body.
+                if attempt == self.retries:
+                    raise
+                self._wait_before_retry(attempt)
+
+    def fetch_text(self, url):
+        return self.fetch(url).decode()
+
+    def fetch_listing(self, url):
+        return iter_directory_listing(self.stream(url))
+
+
+# Directory listings.
+
+ListingEntry = collections.namedtuple("ListingEntry", ["name", "is_directory", "mtime", "size", "type"])
+
+
+class DirectoryListingParser(html.parser.HTMLParser):
+    # Parses lighttpd directory listings, one table row per entry:
+    # <tr><td class="n"><a href="Godot_v3.1-stable_export_templates.tpz">Godot_v3.1-stable_export_templates.tpz</a></td><td class="m">2019-Mar-13 13:23:30</td><td class="s">429.2M</td><td class="t">application/octet-stream</td></tr>
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.entries = collections.deque()
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row = { "href": None, "n": "", "m": "", "s": "", "t": "" }
+        elif tag == "td" and self._row is not None:
+            self._cell = dict(attrs).get("class")
+        elif tag == "a" and self._row is not None and self._cell == "n":
+            self._row["href"] = dict(attrs).get("href")
+
+    def handle_endtag(self, tag):
+        if tag == "td":
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row["href"]:
+                self.entries.append(self._create_entry(self._row))
+            self._row = None
+
+    def handle_data(self, data):
+        if self._row is not None and self._cell in self._row:
+            self._row[self._cell] += data
+
+    def _create_entry(self, row):
+        href = row["href"]
+        mtime = None
+        try:
+            # 2016-Mar-07 20:33:34
+            mtime = datetime.strptime(row["m"].strip(), '%Y-%b-%d %H:%M:%S')
+        except ValueError:
+            pass
+
+        return ListingEntry(href.rstrip("/"), href.endswith("/"), mtime, row["s"].strip(), row["t"].strip())
+
+
+def iter_directory_listing(chunks):
+    # Entries are yielded as soon as their row is parsed, so consumers can stop
+    # reading the page once they've found what they need. They should close the
+    # listing then, which also closes the page stream right away.
+    parser = DirectoryListingParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    with contextlib.closing(chunks):
+        for chunk in chunks:
+            parser.feed(decoder.decode(chunk))
+            while parser.entries:
+                yield parser.entries.popleft()
+
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    while parser.entries:
+        yield parser.entries.popleft()
+
+
 # Helpers.
 
 def find_commit_hash(release_url):
@@ -41,15 +394,16 @@ def find_commit_hash(release_url):
 
     readme_url = f"{release_url}/README.txt"
     try:
-        with urllib.request.urlopen(readme_url) as response:
-            readme_text = response.read().decode()
-            commit_pattern = re.compile(r'Built from commit ([a-f0-9]+)')
-            commit_match = commit_pattern.search(readme_text)
+        readme_text = client.fetch_text(readme_url)
+        commit_pattern = re.compile(r'Built from commit ([a-f0-9]+)')
+        commit_match = commit_pattern.search(readme_text)
 
-            if commit_match:
-                commit_hash = commit_match.group(1)
-    except urllib.error.HTTPError:
-        pass
+        if commit_match:
+            commit_hash = commit_match.group(1)
+    except HttpError as e:
+        # Only a missing file means there's no commit hash, other errors would write incomplete metadata.
+        if e.status != 404:
+            raise
 
     return commit_hash
 
@@ -59,51 +413,50 @@ def find_file_checksums(release_url):
 
     checksums_url = f"{release_url}/SHA512-SUMS.txt"
     try:
-        with urllib.request.urlopen(checksums_url) as response:
-            checksums_text = response.read().decode()
-            checksums_lines = checksums_text.splitlines()
+        checksums_text = client.fetch_text(checksums_url)
+        checksums_lines = checksums_text.splitlines()
 
-            for line in checksums_lines:
-                split_line = line.split("  ")
-                files.append({
-                    "filename": split_line[1],
-                    "checksum": split_line[0]
-                })
+        for line in checksums_lines:
+            split_line = line.split("  ")
+            files.append({
+                "filename": split_line[1],
+                "checksum": split_line[0]
+            })
 
-    except urllib.error.HTTPError:
-        pass
+    except HttpError as e:
+        # Only a missing file means there are no checksums, other errors would write incomplete metadata.
+        if e.status != 404:
+            raise
 
     return files
 
 
-def find_release_date(page_html):
-    # <td class="n"><a href="Godot_v3.1-stable_export_templates.tpz">Godot_v3.1-stable_export_templates.tpz</a></td><td class="m">2019-Mar-13 13:23:30</td><td class="s">429.2M</td><td class="t">application/octet-stream</td>
-    pattern = re.compile(r'<td class="n"><a href="(.+)_export_templates.tpz">(.+)_export_templates.tpz</a></td><td class="m">([A-Za-z0-9\-: ]+)</td><td class="s">([A-Z0-9\.]+)</td><td class="t">application/octet-stream</td>')
-    matches = pattern.findall(page_html)
-
-    if not matches:
-        return None
+def find_release_date(listing):
+    # Stops at the first export templates file, the rest of the page isn't needed.
+    for entry in listing:
+        if entry.name.endswith("_export_templates.tpz") and entry.type == "application/octet-stream":
+            return entry.mtime
 
-    # 2016-Mar-07 20:33:34
-    return datetime.strptime(matches[0][2], '%Y-%b-%d %H:%M:%S')
+    return None
 
 
-def generate_file(version_name, release_name, release_status, release_url):
-    # Navigate to the release's sub-directory for parsing.
-    with urllib.request.urlopen(release_url) as response:
-        release_html = response.read().decode()
-
+def generate_file(version_name, release_name, release_status, release_url, listing=None):
     # Get the release date.
 
     release_date = None
     if release_name in correct_dates:
         release_date = datetime.strptime(correct_dates[release_name], '%Y-%b-%d %H:%M:%S')
     else:
-        # Extract the release date from the export templates file listed on the page.
-        release_date = find_release_date(release_html)
+        # Extract the release date from the export templates file listed on the release's sub-directory page.
+        if listing is None:
+            # Closed right after, so the rest of the page is read before the next request on this thread's connection.
+            with contextlib.closing(client.fetch_listing(release_url)) as release_listing:
+                release_date = find_release_date(release_listing)
+        else:
+            release_date = find_release_date(listing)
     if not release_date:
         print(f"Skipped version '{release_name}' because it's not released")
-        return release_html # Return raw HTML for further parsing.
+        return
 
     # Open the file for writing.
 
@@ -168,49 +521,75 @@ def generate_file(version_name, release_name, release_status, release_url):
             f'}}\n'
         )
 
+        metrics.count("write_metadata", bytes_written=f.tell(), files=1)
         print(f"Written config '{output_path}'")
 
-    return release_html # Return raw HTML for further parsing.
 
+def find_prereleases(version_name, version_url):
+    # Generate a file for the stable release. Its page also lists pre-releases.
 
-# Main routine.
+    version_listing = list(client.fetch_listing(version_url))
+    generate_file(version_name, version_name, "stable", version_url, version_listing)
 
-# Request the download repository on TuxFamily.
-with urllib.request.urlopen(url) as response:
-    html = response.read().decode()
+    # Look for potential builds of pre-releases of the stable release.
 
-# Parse the directory index and find all the links that look like versions.
-pattern = re.compile(r'<a href="(\d\.\d(\.\d(\.\d)?)?/)">')
-matches = pattern.findall(html)
+    prereleases = []
+    folder_names = [entry.name for entry in version_listing if entry.is_directory and entry.name not in ['mono', '..']]
+    for folder_name in folder_names:
+        release_name = f"{version_name}-{folder_name}"
+        if release_name in skip_versions:
+            continue
 
-version_names = []
-for match in matches:
-    subfolder_name = match[0]
-    if subfolder_name.endswith('/'):
-        version_names.append(subfolder_name[:-1])
+        release_url = f"{version_url}/{folder_name}"
+        prereleases.append((version_name, release_name, folder_name, release_url))
 
-# Create the output directory if it doesn't exist.
-if not os.path.exists("./tmp/releases"):
-    os.makedirs("./tmp/releases")
+    return prereleases
 
-for version_name in version_names:
-    version_url = url + version_name
 
-    # Generate a file for the stable release.
+# Main routine.
 
-    version_html = generate_file(version_name, version_name, "stable", version_url)
+parser = argparse.ArgumentParser()
+parser.add_argument("-u", "--url", default=default_url, help=f"Base URL of the download repository (defaults to {default_url}).")
+parser.add_argument("-j", "--jobs", type=int, default=16, help="Number of concurrent requests (defaults to 16).")
+parser.add_argument("--cache", default="./tmp/http-cache", help="Path to the HTTP cache folder (defaults to ./tmp/http-cache).")
+parser.add_argument("--no-cache", action="store_true", help="Always download every page, without reading or updating the HTTP cache.")
+parser.add_argument("--offline", action="store_true", help="Only replay pages from the HTTP cache, without making any requests.")
+metrics.add_metrics_arguments(parser)
+args = parser.parse_args()
 
-    # Generate files for pre-releases of the stable release.
+metrics.start_metrics("generate-metadata", args)
 
-    # Look for potential builds.
-    subfolder_pattern = re.compile(r'<a href="([^"]+/)">')
-    subfolder_matches = subfolder_pattern.findall(version_html)
+if args.offline and args.no_cache:
+    print("Cannot use --offline together with --no-cache.")
+    exit(1)
 
-    folder_names = [match[:-1] for match in subfolder_matches if match not in ['mono/', '../']]
-    for folder_name in folder_names:
-        release_name = f"{version_name}-{folder_name}"
-        if release_name in skip_versions:
-            continue
+client = HttpClient(cache=None if args.no_cache else HttpCache(args.cache), offline=args.offline)
 
-        release_url = f"{version_url}/{folder_name}"
-        generate_file(version_name, release_name, folder_name, release_url)
+url = args.url
+if not url.endswith("/"):
+    url += "/"
+
+# Request the download repository on TuxFamily, and find all the
+# subfolders in its directory index that look like versions.
+version_pattern = re.compile(r'\d\.\d(\.\d(\.\d)?)?')
+
+version_names = []
+for entry in client.fetch_listing(url):
+    if entry.is_directory and version_pattern.fullmatch(entry.name):
+        version_names.append(entry.name)
+
+# Create the output directory if it doesn't exist.
+if not os.path.exists("./tmp/releases"):
+    os.makedirs("./tmp/releases")
+
+with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+    # Stable releases are generated while looking for their pre-releases.
+    prereleases = []
+    with metrics.stage("generate_stable"):
+        for version_prereleases in executor.map(lambda x: find_prereleases(x, url + x), version_names):
+            prereleases += version_prereleases
+
+    # Then all pre-releases are generated at once.
+    with metrics.stage("generate_prereleases"):
+        for _ in executor.map(lambda x: generate_file(*x), prereleases):
+            pass
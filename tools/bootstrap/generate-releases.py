@@ -14,8 +14,13 @@
 import json
 import os
 import subprocess
+import sys
 import yaml
 
+# Shared modules live in the tools folder, one level up.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from release_model import get_release_version
+
 
 website_versions = []
 
@@ -27,30 +32,13 @@ def generate_notes(release_data):
 
     version_version = release_data["version"]
     version_status = release_data["status"]
-    version_tag = f"{version_version}-{version_status}"
-
-    version_bits = version_version.split(".")
-    version_flavor = "patch"
-    if len(version_bits) == 2 and version_bits[1] == "0":
-        version_flavor = "major"
-    elif len(version_bits) == 2 and version_bits[1] != "0":
-        version_flavor = "minor"
+    release_version = get_release_version(version_version, version_status)
+    version_tag = release_version.tag
+    version_flavor = release_version.flavor
 
     # Add the intro line.
 
-    version_name = version_version
-    if version_status != "stable":
-        version_name += " "
-        if version_status.startswith("rc"):
-            version_name += f"RC {version_status.removeprefix('rc')}"
-        elif version_status.startswith("beta"):
-            version_name += f"beta {version_status.removeprefix('beta')}"
-        elif version_status.startswith("alpha"):
-            version_name += f"alpha {version_status.removeprefix('alpha')}"
-        elif version_status.startswith("dev"):
-            version_name += f"dev {version_status.removeprefix('dev')}"
-        else:
-            version_name += version_status
+    version_name = release_version.display_name
 
     version_description = ""
 
@@ -68,9 +56,9 @@ def generate_notes(release_data):
         elif version_flavor == "minor":
             flavor_name = "feature"
 
-        if version_status.startswith("rc"):
+        if release_version.status_prefix == "rc":
             version_description = f"a release candidate for the {version_version} {flavor_name} release. Release candidates focus on finalizing the release and fixing remaining critical bugs."
-        elif version_status.startswith("beta"):
+        elif release_version.status_prefix == "beta":
             version_description = f"a beta snapshot for the {version_version} {flavor_name} release. Beta snapshots are feature-complete and provided for public beta testing to catch as many bugs as possible ahead of the stable release."
         else: # alphas and devs go here.
             version_description = f"a dev snapshot for the {version_version} {flavor_name} release. Dev snapshots are in-development builds of the engine provided for early testing and feature evaluation while the engine is still being worked on."
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+### Build and query a packed binary index of all release checksums.
+###
+### The index contains a fixed-width record for each file of each release,
+### sorted by SHA-512 digest, followed by a table of interned release names
+### and filenames. It can be memory-mapped and binary-searched directly,
+### without parsing anything.
+###
+### Layout (all integers are little-endian):
+###   header:  magic (8 bytes), string count, record count, strings offset (u32 each)
+###   records: digest (64 bytes), release name id, filename id (u32 each)
+###   strings: string count + 1 offsets into string data (u32 each), UTF-8 string data
+###
+### Usage: ./checksum_index.py build
+### Usage: ./checksum_index.py find <sha512>
+
+
+import argparse
+import mmap
+import os
+import struct
+
+from release_loader import DEFAULT_RELEASES_PATH, DIGEST_SIZE, load_releases
+
+
+DEFAULT_INDEX_PATH = "./tmp/checksums.bin"
+
+INDEX_MAGIC = b"GDSUMS\x00\x01"
+HEADER_STRUCT = struct.Struct("<8sIII")
+RECORD_STRUCT = struct.Struct(f"<{DIGEST_SIZE}sII")
+OFFSET_STRUCT = struct.Struct("<I")
+
+
+# Building.
+
+def build_index(releases_path: str, index_path: str) -> int:
+    strings = []
+    string_ids = {}
+
+    def intern_string(value: str) -> int:
+        string_id = string_ids.get(value)
+        if string_id is None:
+            string_id = len(strings)
+            string_ids[value] = string_id
+            strings.append(value)
+        return string_id
+
+    records = []
+    for release in load_releases(releases_path):
+        release_id = intern_string(release.name)
+        for index, filename in enumerate(release.files.filenames):
+            records.append((release.files.get_digest(index), release_id, intern_string(filename)))
+        # Only the records are kept, there's no need to hold every release in memory.
+        release.unload_files()
+
+    records.sort()
+
+    encoded_strings = [value.encode() for value in strings]
+    strings_offset = HEADER_STRUCT.size + len(records) * RECORD_STRUCT.size
+
+    index_dir = os.path.dirname(index_path)
+    if index_dir and not os.path.exists(index_dir):
+        os.makedirs(index_dir)
+
+    # Write to a temporary file first, so readers never map a partially written index.
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER_STRUCT.pack(INDEX_MAGIC, len(strings), len(records), strings_offset))
+        for record in records:
+            f.write(RECORD_STRUCT.pack(*record))
+
+        string_offset = 0
+        for encoded_string in encoded_strings:
+            f.write(OFFSET_STRUCT.pack(string_offset))
+            string_offset += len(encoded_string)
+        f.write(OFFSET_STRUCT.pack(string_offset))
+
+        for encoded_string in encoded_strings:
+            f.write(encoded_string)
+
+    os.replace(temp_path, index_path)
+    return len(records)
+
+
+# Querying.
+
+class ChecksumIndex:
+    def __init__(self, index_path: str):
+        with open(index_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.string_count, self.record_count, self._strings_offset = HEADER_STRUCT.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            self._map.close()
+            raise ValueError(f"File '{index_path}' is not a checksum index.")
+
+        self._string_data_offset = self._strings_offset + (self.string_count + 1) * OFFSET_STRUCT.size
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_string(self, string_id: int) -> str:
+        start, = OFFSET_STRUCT.unpack_from(self._map, self._strings_offset + string_id * OFFSET_STRUCT.size)
+        end, = OFFSET_STRUCT.unpack_from(self._map, self._strings_offset + (string_id + 1) * OFFSET_STRUCT.size)
+        return self._map[self._string_data_offset + start:self._string_data_offset + end].decode()
+
+    def get_digest(self, record_index: int) -> bytes:
+        record_offset = HEADER_STRUCT.size + record_index * RECORD_STRUCT.size
+        return self._map[record_offset:record_offset + DIGEST_SIZE]
+
+    def find(self, digest: bytes):
+        # Find the first record with a matching digest, then collect all following ones.
+        low = 0
+        high = self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_digest(middle) < digest:
+                low = middle + 1
+            else:
+                high = middle
+
+        matches = []
+        record_index = low
+        while record_index < self.record_count and self.get_digest(record_index) == digest:
+            _, release_id, filename_id = RECORD_STRUCT.unpack_from(self._map, HEADER_STRUCT.size + record_index * RECORD_STRUCT.size)
+            matches.append((self.get_string(release_id), self.get_string(filename_id)))
+            record_index += 1
+
+        return matches
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--index", default=DEFAULT_INDEX_PATH, help=f"Path to the checksum index (defaults to {DEFAULT_INDEX_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the checksum index from release metadata files.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+
+    find_parser = subparsers.add_parser("find", help="Print releases and filenames with the given SHA-512 checksum.")
+    find_parser.add_argument("checksum")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        record_count = build_index(args.releases, args.index)
+        print(f"Written checksum index with {record_count} records to '{args.index}'.")
+        return
+
+    try:
+        digest = bytes.fromhex(args.checksum)
+    except ValueError:
+        digest = b""
+    if len(digest) != DIGEST_SIZE:
+        print("Failed to query checksum index: Checksum must be 128 hexadecimal characters.\n")
+        exit(1)
+
+    if not os.path.isfile(args.index):
+        print(f"Failed to query checksum index: Cannot find the index at '{args.index}', build it first.\n")
+        exit(1)
+
+    with ChecksumIndex(args.index) as index:
+        matches = index.find(digest)
+
+    if not matches:
+        print("No matching files found in the checksum index.")
+        exit(1)
+
+    for release_name, filename in matches:
+        print(f"{release_name}\t{filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,338 @@
 #!/usr/bin/env python3
 
 import argparse
+import itertools
+import json
 import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+import metrics
+from file_checksums import compute_file_checksum
+from release_assets import classify_file
+from release_batch import BatchManifestError, read_batch_manifest
+from release_manifests import update_manifests
+from release_model import get_release_version
 
-def find_file_checksums(release_path):
-    files = []
 
-    checksums_path = f"{release_path}/SHA512-SUMS.txt"
-    with open(checksums_path, 'r') as checksums:
-        for line in checksums:
-            split_line = line.split("  ")
-            files.append({
-                "filename": split_line[1].strip(),
-                "checksum": split_line[0].strip()
-            })
+# Version of the checksum cache format, bump it to invalidate existing caches.
+CHECKSUM_CACHE_VERSION = 1
+
+
+def get_release_folder(version_version: str, version_status: str) -> str:
+    basedir = os.environ.get("basedir")
+    return f"{basedir}/releases/{version_version}-{version_status}"
 
-    return files
 
+def find_release_files(release_path):
+    # We are picking up all relevant files using a substring, same as upload-github.sh.
+    # The first letter can be in either case, so we're skipping it.
+    filenames = []
+    for entry in os.scandir(release_path):
+        if entry.is_file() and "odot" in entry.name:
+            filenames.append(entry.name)
 
-def generate_file(version_version: str, version_status: str, git_reference: str):
-    # Open the file for writing.
+    filenames.sort(key=str.lower)
+    return filenames
 
+
+def get_default_checksum_cache_path() -> str:
     basedir = os.environ.get("basedir")
-    buildsdir = os.environ.get('buildsdir')
+    return f"{basedir}/releases/.sha512-cache.json"
 
-    output_path = f"{buildsdir}/releases/godot-{version_version}-{version_status}.json"
-    with open(output_path, 'w') as f:
-        release_name = version_version
-        commit_hash = git_reference
-        if version_status == "stable":
-            commit_hash = f"{version_version}-stable"
+
+def load_checksum_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache_data = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(cache_data, dict) or cache_data.get("version") != CHECKSUM_CACHE_VERSION:
+        return {}
+
+    return cache_data.get("entries", {})
+
+
+def save_checksum_cache(cache_path, cache_entries, cache_size: int) -> None:
+    # Evict least recently used entries when the cache grows past its limit.
+    if len(cache_entries) > cache_size:
+        recent_entries = sorted(cache_entries.items(), key=lambda x: x[1]["used"], reverse=True)
+        cache_entries = dict(recent_entries[:cache_size])
+
+    with AtomicFileWriter(cache_path) as cache_file:
+        json.dump({ "version": CHECKSUM_CACHE_VERSION, "entries": cache_entries }, cache_file)
+
+
+def generate_file_checksums(release_folder: str, executor, cache_entries, verify_count: int = 0):
+    folders = [release_folder]
+    if os.path.isdir(f"{release_folder}/mono"):
+        folders.append(f"{release_folder}/mono")
+
+    release_files = []
+    with metrics.stage("find_files"):
+        for folder in folders:
+            for filename in find_release_files(folder):
+                file_path = os.path.realpath(f"{folder}/{filename}")
+                file_stat = os.stat(file_path)
+                release_files.append({
+                    "folder": folder,
+                    "filename": filename,
+                    "path": file_path,
+                    "size": file_stat.st_size,
+                    "mtime_ns": file_stat.st_mtime_ns,
+                    "inode": file_stat.st_ino,
+                })
+    metrics.count("find_files", files=len(release_files))
+
+    # Files which haven't changed since they were last hashed are taken from the cache.
+    cached_checksums = {}
+    for file in release_files:
+        cache_entry = cache_entries.get(file["path"])
+        if cache_entry is None:
+            continue
+        if cache_entry["size"] == file["size"] and cache_entry["mtime_ns"] == file["mtime_ns"] and cache_entry["inode"] == file["inode"]:
+            cached_checksums[file["path"]] = cache_entry["checksum"]
+
+    # Rehash a sample of cached files anyway, to catch entries that went stale without
+    # changing their size, modification time, or inode.
+    verify_paths = []
+    if verify_count > 0 and cached_checksums:
+        verify_paths = random.sample(sorted(cached_checksums), min(verify_count, len(cached_checksums)))
+
+    hashed_files = [file for file in release_files if file["path"] not in cached_checksums or file["path"] in verify_paths]
+    print(f"Hashing {len(hashed_files)} files in '{release_folder}' ({len(cached_checksums)} cached, {len(verify_paths)} of them verified).")
+
+    # Hash the largest files first, so that a single huge artifact doesn't end up
+    # being processed alone at the end while the other workers are idle.
+    futures = {}
+    for file in sorted(hashed_files, key=lambda x: x["size"], reverse=True):
+        futures[file["path"]] = executor.submit(compute_file_checksum, file["path"])
+    metrics.count("hash", bytes_read=sum(file["size"] for file in hashed_files), files=len(hashed_files))
+    metrics.count("cached", files=len(release_files) - len(hashed_files))
+
+    # Checksums are yielded in the order of files as soon as they are available, and
+    # SHA512-SUMS.txt is written along the way.
+    for folder in folders:
+        checksums_path = f"{folder}/SHA512-SUMS.txt"
+        folder_files = [file for file in release_files if file["folder"] == folder]
+        with AtomicFileWriter(checksums_path) as checksums:
+            for file in folder_files:
+                checksum = cached_checksums.get(file["path"], "")
+                if file["path"] in futures:
+                    # Hashing runs in other processes, this is the time spent waiting for it.
+                    with metrics.stage("hash"):
+                        checksum = futures[file["path"]].result()
+
+                if file["path"] in verify_paths and checksum != cached_checksums[file["path"]]:
+                    print(f"Warning: Stale checksum cache entry for '{file['path']}', using the new checksum.")
+
+                checksums.write(f"{checksum}  {file['filename']}\n")
+                cache_entries[file["path"]] = {
+                    "size": file["size"],
+                    "mtime_ns": file["mtime_ns"],
+                    "inode": file["inode"],
+                    "checksum": checksum,
+                    "used": time.time(),
+                }
+
+                yield {
+                    "filename": file["filename"],
+                    "checksum": checksum,
+                    "asset": classify_file(file["filename"]),
+                }
+
+        metrics.count("write_sums", bytes_written=os.path.getsize(checksums_path), files=1)
+        print(f"Written checksums for {len(folder_files)} files to '{checksums_path}'.")
+
+
+def find_file_checksums(release_path):
+    checksums_path = f"{release_path}/SHA512-SUMS.txt"
+    # .NET builds are not available for every release.
+    if not os.path.isfile(checksums_path):
+        return
+
+    # Read the whole file up front, so the stage doesn't include the time of the consumer.
+    with metrics.stage("read_sums"):
+        with open(checksums_path, 'r') as checksums:
+            lines = checksums.readlines()
+    metrics.count("read_sums", bytes_read=sum(len(line) for line in lines), files=1)
+
+    for line in lines:
+        split_line = line.split("  ")
+        filename = split_line[1].strip()
+        yield {
+            "filename": filename,
+            "checksum": split_line[0].strip(),
+            "asset": classify_file(filename),
+        }
+
+
+class AtomicFileWriter:
+    # Writes into a hidden temporary file next to the target and renames it over
+    # the target only once everything is written and synced to disk. Readers
+    # never observe a partially written file, even if the script crashes.
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        output_dir, output_name = os.path.split(output_path)
+        self._output_dir = output_dir or "."
+        self._temp_path = os.path.join(self._output_dir, f".{output_name}.tmp")
+        self._file = open(self._temp_path, 'w')
+
+    def write(self, data: str) -> None:
+        self._file.write(data)
+
+    def commit(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temp_path, self.output_path)
+
+        # Make sure the rename itself is persisted as well.
+        dir_fd = os.open(self._output_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
         else:
-            release_name = f"{version_version}-{version_status}"
+            self.abort()
 
-        # Start writing the file with basic meta information.
-        f.write(
+
+class ReleaseMetadataWriter(AtomicFileWriter):
+    # Streams release metadata in the same layout as the rest of releases/*.json,
+    # writing each file entry as soon as it's known. Values are JSON-encoded, so
+    # unusual filenames are escaped properly.
+
+    def __init__(self, output_path: str, release_data):
+        super().__init__(output_path)
+        self._file_count = 0
+
+        self.write(
             f'{{\n'
-            f'    "name": "{release_name}",\n'
-            f'    "version": "{version_version}",\n'
-            f'    "status": "{version_status}",\n'
-            f'    "release_date": {int(datetime.now().timestamp())},\n'
-            f'    "git_reference": "{commit_hash}",\n'
+            f'    "name": {json.dumps(release_data["name"])},\n'
+            f'    "version": {json.dumps(release_data["version"])},\n'
+            f'    "status": {json.dumps(release_data["status"])},\n'
+            f'    "release_date": {int(release_data["release_date"])},\n'
+            f'    "git_reference": {json.dumps(release_data["git_reference"])},\n'
             f'\n'
-            f'    "files": [\n'
+            f'    "files": ['
+        )
+
+    def write_file(self, filename: str, checksum: str) -> None:
+        # Separators are written before each entry, since we don't know which one is last.
+        self.write(
+            f'{"," if self._file_count > 0 else ""}\n'
+            f'        {{\n'
+            f'            "filename": {json.dumps(filename)},\n'
+            f'            "checksum": {json.dumps(checksum)}\n'
+            f'        }}'
         )
+        self._file_count += 1
 
-        # Generate the list of files.
-
-        release_folder = f"{basedir}/releases/{version_version}-{version_status}"
-        standard_files = find_file_checksums(f"{release_folder}")
-        mono_files = find_file_checksums(f"{release_folder}/mono")
-
-        for i, file in enumerate(standard_files):
-            f.write(
-                f'        {{\n'
-                f'            "filename": "{file["filename"]}",\n'
-                f'            "checksum": "{file["checksum"]}"\n'
-                f'        }}{"" if i == len(standard_files) - 1 and len(mono_files) == 0 else ","}\n'
-            )
-
-        for i, file in enumerate(mono_files):
-            f.write(
-                f'        {{\n'
-                f'            "filename": "{file["filename"]}",\n'
-                f'            "checksum": "{file["checksum"]}"\n'
-                f'        }}{"" if i == len(mono_files) - 1 else ","}\n'
-            )
-
-        # Finish the file.
-        f.write(
+    def commit(self) -> None:
+        self.write(
+            f'\n'
             f'    ]\n'
             f'}}\n'
         )
+        super().commit()
+
+
+def generate_file(version_version: str, version_status: str, git_reference: str, files=None):
+    buildsdir = os.environ.get('buildsdir')
+    output_path = f"{buildsdir}/releases/godot-{version_version}-{version_status}.json"
+
+    release_version = get_release_version(version_version, version_status)
+    commit_hash = git_reference
+    if release_version.is_stable:
+        commit_hash = release_version.tag
+
+    # Read the list of files from SHA512-SUMS.txt, unless it's being generated.
+    if files is None:
+        release_folder = get_release_folder(version_version, version_status)
+        files = itertools.chain(find_file_checksums(f"{release_folder}"), find_file_checksums(f"{release_folder}/mono"))
+
+    release_data = {
+        "name": release_version.name,
+        "version": version_version,
+        "status": version_status,
+        "release_date": datetime.now().timestamp(),
+        "git_reference": commit_hash,
+    }
+    # Files are streamed from their source, so this stage includes the time spent reading or hashing them.
+    with metrics.stage("write_metadata"), ReleaseMetadataWriter(output_path, release_data) as writer:
+        for file in files:
+            writer.write_file(file["filename"], file["checksum"])
+            # Unknown files would be missing from the asset index, see release_assets.py.
+            if file.get("asset") is None:
+                print(f"Warning: Cannot classify release file '{file['filename']}', add it to release_assets.py.")
+    metrics.count("write_metadata", bytes_written=os.path.getsize(output_path), files=1)
+
+    print(f"Written release metadata to '{output_path}'.")
+    return release_data
+
+
+def generate_files(releases, jobs: int, compute_checksums: bool, cache_path: str, cache_size: int, verify_count: int) -> bool:
+    cache_entries = {}
+    if compute_checksums and cache_path:
+        with metrics.stage("load_cache"):
+            cache_entries = load_checksum_cache(cache_path)
 
-        print(f"Written release metadata to '{output_path}'.")
+    def generate_release(release):
+        release_version, release_flavor, git_reference = release
+        files = None
+        if compute_checksums:
+            files = generate_file_checksums(get_release_folder(release_version, release_flavor), hash_executor, cache_entries, verify_count)
+        return generate_file(release_version, release_flavor, git_reference, files)
+
+    # Releases are processed concurrently, while all of their files share one pool of hashing processes.
+    success = True
+    releases_data = []
+    with ProcessPoolExecutor(max_workers=jobs) as hash_executor, ThreadPoolExecutor(max_workers=jobs) as release_executor:
+        futures = [(release, release_executor.submit(generate_release, release)) for release in releases]
+        for release, future in futures:
+            try:
+                releases_data.append(future.result())
+            except Exception as e:
+                print(f"Failed to create release metadata for {release[0]}-{release[1]}: {e}")
+                success = False
+
+    if compute_checksums and cache_path:
+        with metrics.stage("save_cache"):
+            save_checksum_cache(cache_path, cache_entries, cache_size)
+        metrics.count("save_cache", bytes_written=os.path.getsize(cache_path), files=1)
+
+    # Manifests are updated once from the main thread, so concurrent releases don't race for them.
+    if releases_data:
+        buildsdir = os.environ.get('buildsdir')
+        manifests_path = f"{buildsdir}/manifests"
+        try:
+            with metrics.stage("update_manifests"):
+                manifests_rebuilt = update_manifests(f"{buildsdir}/releases", manifests_path, releases_data)
+            if manifests_rebuilt:
+                print(f"Rebuilt release manifests in '{manifests_path}'.")
+            else:
+                print(f"Updated release manifests in '{manifests_path}'.")
+        except (OSError, ValueError) as e:
+            print(f"Failed to update release manifests in '{manifests_path}': {e}")
+            success = False
+
+    return success
 
 
 def main() -> None:
@@ -87,19 +344,42 @@ def main() -> None:
     parser.add_argument("-v", "--version", default="", help="Godot version in the major.minor.patch format (patch should be omitted for major and minor releases).")
     parser.add_argument("-f", "--flavor", default="stable", help="Release flavor, e.g. dev, alpha, beta, rc, stable (defaults to stable).")
     parser.add_argument("-g", "--git", default="", help="Git commit hash tagged for this release.")
+    parser.add_argument("-c", "--checksums", action="store_true", help="Compute SHA-512 checksums of release files and write SHA512-SUMS.txt, instead of reading existing ones.")
+    parser.add_argument("-b", "--batch", default="", help="Path to a manifest with one release per line (version, flavor, git hash), or - to read it from stdin.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of releases and files processed in parallel (defaults to the number of CPUs).")
+    parser.add_argument("--cache", default="", help="Path to the checksum cache used with --checksums (defaults to releases/.sha512-cache.json in the basedir).")
+    parser.add_argument("--no-cache", action="store_true", help="Hash every file, without reading or updating the checksum cache.")
+    parser.add_argument("--cache-size", type=int, default=10000, help="Maximum number of entries kept in the checksum cache (defaults to 10000).")
+    parser.add_argument("--verify-cache", type=int, nargs="?", const=10, default=0, help="Rehash a random sample of N cached files to detect stale entries (defaults to 10 files when N is omitted).")
+    metrics.add_metrics_arguments(parser)
     args = parser.parse_args()
 
-    if args.version == "" or args.git == "":
-        print("Failed to create release metadata: Godot version and git hash cannot be empty.\n")
-        parser.print_help()
-        exit(1)
+    metrics.start_metrics("create-release-metadata", args)
+
+    releases = []
+    if args.batch != "":
+        try:
+            releases = read_batch_manifest(args.batch)
+        except (OSError, BatchManifestError) as e:
+            print(f"Failed to create release metadata: Cannot read batch manifest '{args.batch}': {e}\n")
+            exit(1)
+    else:
+        if args.version == "" or args.git == "":
+            print("Failed to create release metadata: Godot version and git hash cannot be empty.\n")
+            parser.print_help()
+            exit(1)
 
-    release_version = args.version
-    release_flavor = args.flavor
-    if release_flavor == "":
-        release_flavor = "stable"
+        release_flavor = args.flavor
+        if release_flavor == "":
+            release_flavor = "stable"
+        releases.append((args.version, release_flavor, args.git))
 
-    generate_file(release_version, release_flavor, args.git)
+    cache_path = ""
+    if not args.no_cache:
+        cache_path = args.cache or get_default_checksum_cache_path()
+
+    if not generate_files(releases, args.jobs, args.checksums, cache_path, args.cache_size, args.verify_cache):
+        exit(1)
 
 
 if __name__ == "__main__":
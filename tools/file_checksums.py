@@ -0,0 +1,25 @@
+### Shared helpers for computing checksums of release files.
+
+
+import hashlib
+
+
+# Artifacts can be several gigabytes in size, so they are hashed in fixed-size chunks.
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_checksum(file_path, chunk_size: int = CHECKSUM_CHUNK_SIZE):
+    checksum = hashlib.sha512()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    # Reads go straight into a reused buffer, and hashlib releases the GIL while
+    # hashing large chunks, so this also scales well when called from threads.
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            read_size = f.readinto(buffer)
+            if not read_size:
+                break
+            checksum.update(view[:read_size])
+
+    return checksum.hexdigest()
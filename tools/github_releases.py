@@ -0,0 +1,335 @@
+### Shared helpers for publishing releases with the GitHub REST API.
+###
+### Requests go through a pool of keep-alive connections, one per host and
+### worker thread. Failed requests are retried with an increasing delay,
+### and rate limit responses wait until the limit resets. A journal file
+### records completed operations, so interrupted runs can be resumed.
+###
+### The API URL can point to any server implementing the same endpoints,
+### e.g. a local mock for testing.
+
+
+import email.utils
+import http.client
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_API_URL = "https://api.github.com"
+DEFAULT_REPOSITORY = "godotengine/godot-builds"
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Never wait longer than this for a rate limit to reset, rather fail and resume later.
+MAX_RATE_LIMIT_WAIT = 15 * 60
+
+
+class GitHubError(Exception):
+    def __init__(self, method, url, status, message):
+        super().__init__(f"{method} {url} failed with HTTP {status}: {message}")
+        self.status = status
+
+
+def get_github_token() -> str:
+    token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
+    if token:
+        return token
+
+    # Reuse the authentication of the GitHub CLI, which upload-github.sh relies on as well.
+    try:
+        result = subprocess.run(["gh", "auth", "token"], capture_output=True, text=True)
+    except OSError:
+        return ""
+
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+class GitHubClient:
+    def __init__(self, repository: str, token: str, api_url: str = DEFAULT_API_URL, retries: int = 5, backoff: float = 1.0, timeout: float = 60):
+        self.repository = repository
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # Connections.
+
+    def _get_connection(self, host):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        connection = connections.get(host)
+        if connection is None:
+            scheme, netloc = host
+            # Large blocks make streaming assets from disk considerably faster.
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(netloc, timeout=self.timeout, blocksize=UPLOAD_BLOCK_SIZE)
+            else:
+                connection = http.client.HTTPConnection(netloc, timeout=self.timeout, blocksize=UPLOAD_BLOCK_SIZE)
+            connections[host] = connection
+
+        return connection
+
+    def _drop_connection(self, host):
+        connection = self._local.connections.pop(host, None)
+        if connection is not None:
+            connection.close()
+
+    def _get_retry_delay(self, response, attempt):
+        # Primary rate limit: wait until the reset time reported by GitHub.
+        if response.getheader("X-RateLimit-Remaining") == "0" and response.getheader("X-RateLimit-Reset"):
+            return min(MAX_RATE_LIMIT_WAIT, max(1, int(response.getheader("X-RateLimit-Reset")) - int(time.time()) + 1))
+        # Secondary rate limits and overloaded servers may ask to retry after a delay,
+        # given either in seconds or as an HTTP date.
+        retry_after = response.getheader("Retry-After")
+        if retry_after:
+            try:
+                return min(MAX_RATE_LIMIT_WAIT, max(0, int(retry_after)))
+            except ValueError:
+                pass
+            try:
+                retry_time = email.utils.parsedate_to_datetime(retry_after)
+                return min(MAX_RATE_LIMIT_WAIT, max(1, int(retry_time.timestamp() - time.time()) + 1))
+            except (TypeError, ValueError):
+                pass
+
+        return self.backoff * (2 ** attempt)
+
+    def request(self, method: str, url: str, body=None, headers=None, expected_status=(200, 201)):
+        if not url.startswith("http"):
+            url = f"{self.api_url}{url}"
+
+        parsed_url = urllib.parse.urlsplit(url)
+        host = (parsed_url.scheme, parsed_url.netloc)
+        request_path = parsed_url.path
+        if parsed_url.query:
+            request_path += f"?{parsed_url.query}"
+
+        request_headers = {
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "godot-builds-tools",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if self.token:
+            request_headers["Authorization"] = f"Bearer {self.token}"
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            request_headers["Content-Type"] = "application/json"
+        if headers:
+            request_headers.update(headers)
+
+        # Files are streamed from disk, so they need to be rewound when a request is retried.
+        body_position = body.tell() if hasattr(body, "seek") else None
+
+        delay = 0
+        for attempt in range(self.retries + 1):
+            if delay > 0:
+                time.sleep(delay)
+            if body_position is not None:
+                body.seek(body_position)
+
+            try:
+                connection = self._get_connection(host)
+                connection.request(method, request_path, body=body, headers=request_headers)
+                response = connection.getresponse()
+                response_body = response.read()
+            except (http.client.HTTPException, OSError):
+                self._drop_connection(host)
+                delay = self.backoff * (2 ** attempt)
+                continue
+
+            if response.will_close:
+                self._drop_connection(host)
+
+            rate_limited = response.status == 429 or (response.status == 403 and (response.getheader("X-RateLimit-Remaining") == "0" or response.getheader("Retry-After")))
+            if rate_limited or response.status >= 500:
+                delay = self._get_retry_delay(response, attempt)
+                continue
+
+            response_data = None
+            if response_body:
+                try:
+                    response_data = json.loads(response_body)
+                except ValueError:
+                    response_data = response_body.decode(errors="replace")
+
+            if response.status not in expected_status:
+                message = response_data.get("message", "") if isinstance(response_data, dict) else response_data
+                raise GitHubError(method, url, response.status, message)
+
+            return response.status, response_data
+
+        raise GitHubError(method, url, "-", "retries exhausted")
+
+    # Releases.
+
+    def get_release_by_tag(self, tag: str):
+        status, release = self.request("GET", f"/repos/{self.repository}/releases/tags/{urllib.parse.quote(tag)}", expected_status=(200, 404))
+        if status == 200:
+            return release
+
+        # Draft releases are not returned by tag, only when listing all releases.
+        page = 1
+        while True:
+            _, page_releases = self.request("GET", f"/repos/{self.repository}/releases?per_page=100&page={page}")
+            for release in page_releases:
+                if release["tag_name"] == tag:
+                    return release
+            if len(page_releases) < 100:
+                return None
+            page += 1
+
+    def create_release(self, tag: str, title: str, notes: str, prerelease: bool, draft: bool = False):
+        _, release = self.request("POST", f"/repos/{self.repository}/releases", body={
+            "tag_name": tag,
+            "name": title,
+            "body": notes,
+            "prerelease": prerelease,
+            "draft": draft,
+        })
+        return release
+
+    # Assets.
+
+    def list_assets(self, release_id: int):
+        assets = []
+        page = 1
+        while True:
+            _, page_assets = self.request("GET", f"/repos/{self.repository}/releases/{release_id}/assets?per_page=100&page={page}")
+            assets += page_assets
+            if len(page_assets) < 100:
+                return assets
+            page += 1
+
+    def upload_asset(self, release, file_path: str, name: str = ""):
+        name = name or os.path.basename(file_path)
+        # The upload URL is a URI template, e.g. https://uploads.github.com/repos/owner/repo/releases/1/assets{?name,label}
+        upload_url = release["upload_url"].split("{", 1)[0]
+
+        with open(file_path, 'rb') as asset_file:
+            _, asset = self.request("POST", f"{upload_url}?name={urllib.parse.quote(name)}", body=asset_file, headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(os.fstat(asset_file.fileno()).st_size),
+            })
+        return asset
+
+    def delete_asset(self, asset_id: int) -> None:
+        self.request("DELETE", f"/repos/{self.repository}/releases/assets/{asset_id}", expected_status=(204, 404))
+
+
+class Journal:
+    # An append-only file with one JSON object per completed operation. Each record
+    # is synced to disk before moving on, so a crash never loses finished work.
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._done = {}
+
+        journal_dir = os.path.dirname(journal_path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+
+        if os.path.isfile(journal_path):
+            with open(journal_path, 'r') as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line may be incomplete if the previous run was killed.
+                        continue
+                    self._done[record["key"]] = record
+
+    def is_done(self, key: str) -> bool:
+        return key in self._done
+
+    def get(self, key: str):
+        return self._done.get(key)
+
+    def record(self, key: str, **data) -> None:
+        record = { "key": key, "time": int(time.time()), **data }
+        with self._lock:
+            with open(self.journal_path, 'a') as journal_file:
+                journal_file.write(json.dumps(record) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self._done[key] = record
+
+
+# Asset uploads.
+
+def upload_release_asset(client, journal, github_release, existing_assets, file_path: str) -> bool:
+    # Returns True if the file was uploaded, and False if it was already there.
+    name = os.path.basename(file_path)
+    file_size = os.path.getsize(file_path)
+    # A release deleted and created again under the same tag gets a new id, and needs all its files again.
+    journal_key = f"asset:{client.repository}:{github_release['id']}:{name}"
+
+    # The journal is only trusted while the recorded asset is still attached to the release.
+    journal_record = journal.get(journal_key)
+    existing_asset = existing_assets.get(name)
+    if journal_record and journal_record["size"] == file_size and existing_asset and existing_asset["id"] == journal_record["asset_id"]:
+        return False
+
+    # Assets left behind by an interrupted upload, or with a different size, are replaced.
+    if existing_asset:
+        if existing_asset["size"] == file_size and existing_asset.get("state", "uploaded") == "uploaded":
+            journal.record(journal_key, asset_id=existing_asset["id"], size=file_size)
+            return False
+        client.delete_asset(existing_asset["id"])
+
+    for attempt in range(2):
+        try:
+            asset = client.upload_asset(github_release, file_path, name)
+        except GitHubError as e:
+            # A retried request may find a partial asset created by the failed attempt.
+            if e.status != 422 or attempt > 0:
+                raise
+            for asset in client.list_assets(github_release["id"]):
+                if asset["name"] == name:
+                    client.delete_asset(asset["id"])
+            continue
+
+        if asset["size"] == file_size:
+            journal.record(journal_key, asset_id=asset["id"], size=file_size)
+            return True
+
+        # The server received something else than what we have on disk, try again.
+        client.delete_asset(asset["id"])
+        if attempt > 0:
+            raise GitHubError("POST", github_release["upload_url"], "-", f"Uploaded size of '{name}' is {asset['size']} bytes, expected {file_size} bytes.")
+
+    raise GitHubError("POST", github_release["upload_url"], "-", f"Cannot upload '{name}'.")
+
+
+def upload_release_assets(client, journal, github_release, file_paths, jobs: int):
+    # Returns the number of uploaded files, raises the first error after all uploads have finished.
+    existing_assets = {}
+    for asset in client.list_assets(github_release["id"]):
+        existing_assets[asset["name"]] = asset
+
+    uploaded_count = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [(file_path, executor.submit(upload_release_asset, client, journal, github_release, existing_assets, file_path)) for file_path in file_paths]
+        for file_path, future in futures:
+            try:
+                if future.result():
+                    uploaded_count += 1
+                    print(f"Uploaded '{file_path}'.")
+            except (GitHubError, OSError) as e:
+                print(f"Failed to upload '{file_path}': {e}")
+                errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+    return uploaded_count
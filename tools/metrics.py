@@ -0,0 +1,242 @@
+### Shared helpers for measuring where the release tooling spends its time.
+###
+### Code is split into named stages (e.g. hash, read_sums, write_metadata).
+### Each stage records the number of calls, wall and CPU time, bytes read
+### and written, and the number of files processed. Times are summed over
+### all calls, so stages running in parallel threads can add up to more
+### than the elapsed time. CPU time is measured per thread, work done in
+### other processes (e.g. hashing pools) is only part of the run totals.
+###
+### Nothing is recorded unless a script is started with --metrics. Results
+### are written when the script exits, either appended as JSON lines, or as
+### an OpenMetrics text file (e.g. for the node_exporter textfile collector)
+### if the path ends with .prom or --metrics-format openmetrics is used.
+###
+### --profile and --trace-memory additionally run the main thread under
+### cProfile and track memory allocations with tracemalloc.
+
+
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where only the time of this process is reported.
+    resource = None
+
+
+METRICS_PREFIX = "godot_builds"
+
+# Stage fields, in the order they are reported.
+STAGE_FIELDS = ["calls", "wall_seconds", "cpu_seconds", "bytes_read", "bytes_written", "files"]
+
+# OpenMetrics names of stage fields, which need to end with their unit.
+OPENMETRICS_NAMES = {
+    "calls": "stage_calls",
+    "wall_seconds": "stage_wall_seconds",
+    "cpu_seconds": "stage_cpu_seconds",
+    "bytes_read": "stage_read_bytes",
+    "bytes_written": "stage_written_bytes",
+    "files": "stage_files",
+}
+
+
+class StageMetrics:
+    __slots__ = STAGE_FIELDS
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files = 0
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self.tool = ""
+        self.enabled = False
+        self.stages = {}
+        self.output_path = ""
+        self.output_format = "jsonl"
+        self.profile_path = ""
+        self.trace_memory = False
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+        self._finished = False
+
+    def _get_stage(self, name: str) -> StageMetrics:
+        stage_metrics = self.stages.get(name)
+        if stage_metrics is None:
+            stage_metrics = self.stages[name] = StageMetrics()
+        return stage_metrics
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.thread_time() - start_cpu
+            with self._lock:
+                stage_metrics = self._get_stage(name)
+                stage_metrics.calls += 1
+                stage_metrics.wall_seconds += wall_seconds
+                stage_metrics.cpu_seconds += cpu_seconds
+
+    def count(self, name: str, bytes_read: int = 0, bytes_written: int = 0, files: int = 0) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            stage_metrics = self._get_stage(name)
+            stage_metrics.bytes_read += bytes_read
+            stage_metrics.bytes_written += bytes_written
+            stage_metrics.files += files
+
+    # Lifecycle.
+
+    def start(self, tool: str, output_path: str, output_format: str, profile_path: str, trace_memory: bool) -> None:
+        self.tool = tool
+        self.enabled = output_path != ""
+        self.output_path = output_path
+        self.output_format = output_format or ("openmetrics" if output_path.endswith(".prom") else "jsonl")
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+        if trace_memory:
+            tracemalloc.start()
+        if profile_path:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        # Scripts exit from many places, e.g. with exit(1) on errors.
+        atexit.register(self.finish)
+
+    def get_total(self) -> StageMetrics:
+        total = StageMetrics()
+        total.calls = 1
+        total.wall_seconds = time.perf_counter() - self._start_wall
+        total.cpu_seconds = time.process_time() - self._start_cpu
+        if resource is not None:
+            # Includes processes of finished process pools, e.g. for hashing.
+            children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            total.cpu_seconds += children_usage.ru_utime + children_usage.ru_stime
+
+        for stage_metrics in self.stages.values():
+            total.bytes_read += stage_metrics.bytes_read
+            total.bytes_written += stage_metrics.bytes_written
+            total.files += stage_metrics.files
+
+        return total
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            print(f"Written profile to '{self.profile_path}'.", file=sys.stderr)
+
+        memory_peak = 0
+        if self.trace_memory:
+            _, memory_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"Peak traced memory: {memory_peak} bytes.", file=sys.stderr)
+
+        if not self.enabled:
+            return
+
+        stages = dict(self.stages)
+        stages["total"] = self.get_total()
+
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        if self.output_format == "openmetrics":
+            write_openmetrics(self.output_path, self.tool, stages, memory_peak)
+        else:
+            write_json_lines(self.output_path, self.tool, stages, memory_peak)
+
+
+# Output formats.
+
+def write_json_lines(output_path: str, tool: str, stages, memory_peak: int) -> None:
+    # Appended, so a single file collects the history of many runs.
+    run_time = int(time.time())
+    with open(output_path, 'a') as output_file:
+        for name, stage_metrics in stages.items():
+            record = { "time": run_time, "tool": tool, "stage": name }
+            for field in STAGE_FIELDS:
+                record[field] = getattr(stage_metrics, field)
+            if name == "total" and memory_peak:
+                record["memory_peak_bytes"] = memory_peak
+            output_file.write(json.dumps(record) + "\n")
+
+
+def write_openmetrics(output_path: str, tool: str, stages, memory_peak: int) -> None:
+    lines = []
+    for field in STAGE_FIELDS:
+        metric_name = f"{METRICS_PREFIX}_{OPENMETRICS_NAMES[field]}"
+        lines.append(f"# TYPE {metric_name} counter")
+        for name, stage_metrics in stages.items():
+            lines.append(f'{metric_name}_total{{tool="{tool}",stage="{name}"}} {getattr(stage_metrics, field)}')
+
+    if memory_peak:
+        lines.append(f"# TYPE {METRICS_PREFIX}_memory_peak_bytes gauge")
+        lines.append(f'{METRICS_PREFIX}_memory_peak_bytes{{tool="{tool}"}} {memory_peak}')
+
+    lines.append("# EOF")
+
+    # Collectors may read the file at any time, so it's replaced in one go.
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w') as output_file:
+        output_file.write("\n".join(lines) + "\n")
+    os.replace(temp_path, output_path)
+
+
+# Shared recorder, used by all modules of a script.
+
+recorder = MetricsRecorder()
+
+
+def stage(name: str):
+    return recorder.stage(name)
+
+
+def count(name: str, bytes_read: int = 0, bytes_written: int = 0, files: int = 0) -> None:
+    recorder.count(name, bytes_read, bytes_written, files)
+
+
+def add_metrics_arguments(parser) -> None:
+    parser.add_argument("--metrics", default="", help="Record timings of each stage and write them to this path when done.")
+    parser.add_argument("--metrics-format", default="", choices=["jsonl", "openmetrics"], help="Format of --metrics: JSON lines appended to the file, or an OpenMetrics text file (defaults to openmetrics for .prom files, jsonl otherwise).")
+    parser.add_argument("--profile", default="", help="Profile the main thread with cProfile and write the stats to this path.")
+    parser.add_argument("--trace-memory", action="store_true", help="Trace memory allocations and report the peak usage.")
+
+
+def start_metrics(tool: str, args) -> None:
+    recorder.start(tool, args.metrics, args.metrics_format, args.profile, args.trace_memory)
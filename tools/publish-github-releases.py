@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+### Publish GitHub releases for many Godot releases at once.
+###
+### For each release metadata file a GitHub release is created using the
+### release notes generated by create-release-notes.py (see its --batch
+### option). Releases are created one at a time, in the order they were
+### released. Releases which already exist on GitHub are skipped, and every
+### completed release is written to a journal, so an interrupted run
+### continues where it stopped.
+###
+### With --assets-dir, files from <assets-dir>/<tag>/ (and its mono/
+### subfolder) are uploaded to each release as well, skipping files which
+### are already attached. Assets of several releases are uploaded
+### concurrently. See upload-release-assets.py for details.
+###
+### Usage: ./publish-github-releases.py
+### Usage: ./publish-github-releases.py 4.3-rc1 4.3-stable --assets-dir ../godot-build-scripts/releases
+
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from github_releases import DEFAULT_API_URL, DEFAULT_REPOSITORY, GitHubClient, GitHubError, Journal, get_github_token, upload_release_assets
+from release_loader import DEFAULT_RELEASES_PATH, get_release_path, load_release, load_releases
+
+
+def find_asset_files(assets_path: str):
+    asset_files = []
+
+    for folder in [assets_path, os.path.join(assets_path, "mono")]:
+        if not os.path.isdir(folder):
+            continue
+        for entry in sorted(os.scandir(folder), key=lambda x: x.name):
+            if entry.is_file():
+                asset_files.append(entry.path)
+
+    return asset_files
+
+
+def create_release(client, journal, release, notes_path: str, draft: bool, needs_release: bool):
+    # Returns the GitHub release, or None if it was published before and isn't needed, and the result.
+    release_tag = release.tag
+    journal_key = f"release:{client.repository}:{release_tag}"
+
+    if journal.is_done(journal_key):
+        if not needs_release:
+            return None, "already published"
+
+        # The release is still needed to upload assets to it.
+        github_release = client.get_release_by_tag(release_tag)
+        if github_release is None:
+            raise GitHubError("GET", f"releases/tags/{release_tag}", 404, "Release was published before, but doesn't exist anymore.")
+        return github_release, "already published"
+
+    github_release = client.get_release_by_tag(release_tag)
+    if github_release is None:
+        notes_file = os.path.join(notes_path, f"release-notes-{release_tag}.txt")
+        if not os.path.isfile(notes_file):
+            raise FileNotFoundError(f"Cannot find release notes at '{notes_file}'.")
+        with open(notes_file, 'r') as notes:
+            release_notes = notes.read()
+
+        github_release = client.create_release(release_tag, release_tag, release_notes, release.status != "stable", draft)
+        result = "published"
+    else:
+        result = "already exists"
+
+    journal.record(journal_key, release_id=github_release["id"])
+    return github_release, result
+
+
+def upload_assets(client, journal, release, github_release, assets_path: str, asset_jobs: int) -> str:
+    asset_files = find_asset_files(os.path.join(assets_path, release.tag))
+    uploaded_count = upload_release_assets(client, journal, github_release, asset_files, asset_jobs)
+    return f"uploaded {uploaded_count} of {len(asset_files)} assets"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="Releases to publish, e.g. 4.3-stable or 4.4-beta1 (defaults to all releases).")
+    parser.add_argument("-r", "--repository", default=DEFAULT_REPOSITORY, help=f"GitHub repository to publish to (defaults to {DEFAULT_REPOSITORY}).")
+    parser.add_argument("--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    parser.add_argument("--notes-dir", default="./tmp", help="Path to the folder with release-notes-<tag>.txt files written by create-release-notes.py (defaults to ./tmp).")
+    parser.add_argument("--assets-dir", default="", help="Path to the folder with release files in <tag> subfolders, uploaded as release assets.")
+    parser.add_argument("--journal", default="./tmp/publish-journal.jsonl", help="Path to the journal of completed work (defaults to ./tmp/publish-journal.jsonl).")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help=f"Base URL of the GitHub API (defaults to {DEFAULT_API_URL}).")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Number of releases whose assets are uploaded in parallel (defaults to 4).")
+    parser.add_argument("--asset-jobs", type=int, default=2, help="Number of assets uploaded in parallel for each release (defaults to 2).")
+    parser.add_argument("-d", "--draft", action="store_true", help="Create releases as drafts.")
+    args = parser.parse_args()
+
+    token = get_github_token()
+    if not token:
+        print("Failed to publish releases: Set GITHUB_TOKEN or log in with the GitHub CLI (gh auth login).\n")
+        exit(1)
+
+    if args.names:
+        releases = []
+        for name in args.names:
+            release_path = get_release_path(args.releases, name)
+            if not os.path.isfile(release_path):
+                print(f"Failed to publish releases: Cannot find release metadata at '{release_path}'.\n")
+                exit(1)
+            releases.append(load_release(release_path))
+    else:
+        releases = load_releases(args.releases)
+
+    # Releases are created one at a time in order, so they are listed on GitHub roughly in the order
+    # they were released. Only their assets are uploaded in parallel.
+    releases.sort(key=lambda x: x.release_date)
+
+    client = GitHubClient(args.repository, token, args.api_url)
+    journal = Journal(args.journal)
+
+    failed_count = 0
+    created_releases = []
+    for release in releases:
+        try:
+            github_release, result = create_release(client, journal, release, args.notes_dir, args.draft, bool(args.assets_dir))
+        except (GitHubError, OSError) as e:
+            print(f"Failed to publish release {release.tag}: {e}")
+            failed_count += 1
+            continue
+
+        if not args.assets_dir:
+            print(f"Release {release.tag}: {result}.")
+        else:
+            created_releases.append((release, github_release, result))
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [(release, result, executor.submit(upload_assets, client, journal, release, github_release, args.assets_dir, args.asset_jobs)) for release, github_release, result in created_releases]
+        for release, result, future in futures:
+            try:
+                print(f"Release {release.tag}: {result}, {future.result()}.")
+            except (GitHubError, OSError) as e:
+                print(f"Failed to upload assets of release {release.tag}: {e}")
+                failed_count += 1
+
+    if failed_count > 0:
+        print(f"Failed to publish {failed_count} of {len(releases)} releases, run the script again to resume.")
+        exit(1)
+
+    print(f"Published {len(releases)} releases to {args.repository}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+### Generate a static JSON API from release metadata files.
+###
+### Instead of downloading the whole releases folder, clients fetch the
+### small root index first, then only the shards they need:
+###   index.json:              branches and channels, with the path, ETag,
+###                            size, and latest release of each shard.
+###   branches/<branch>.json:  all releases of a minor branch (e.g. 4.3),
+###                            including their files and checksums.
+###   channels/<channel>.json: all releases of a channel (stable, rc, beta,
+###                            alpha, dev), without files.
+###   etags.json:              the ETag of every file above, for the CDN.
+###
+### Shards are written in a deterministic order and compact form, so an
+### unchanged shard keeps the same bytes and ETag, which is the SHA-256 of
+### its contents. Each file gets precompressed .gz and, if the brotli module
+### is installed, .br siblings.
+###
+### Builds are incremental: the state file remembers the size and mtime of
+### every release file, and only shards of added, changed, or removed
+### releases are regenerated.
+###
+### Usage: ./release_api.py build
+### Usage: ./release_api.py build -o ./tmp/api --full
+
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    # Optional, only .gz files are written without it.
+    brotli = None
+
+from release_loader import DEFAULT_RELEASES_PATH, load_release_files, read_release_header
+from release_model import STATUS_RANKS, get_release_version
+
+
+DEFAULT_API_PATH = "./tmp/api"
+DEFAULT_STATE_PATH = "./tmp/api-state.json"
+
+# Version of the API and state layouts, bump it when they change.
+API_FORMAT = 1
+
+INDEX_FILENAME = "index.json"
+ETAGS_FILENAME = "etags.json"
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def get_etag(data: bytes) -> str:
+    return f'"{hashlib.sha256(data).hexdigest()}"'
+
+
+def get_branch_path(branch: str) -> str:
+    return f"branches/{branch}.json"
+
+
+def get_channel_path(channel: str) -> str:
+    return f"channels/{channel}.json"
+
+
+# Writing.
+
+def write_file(file_path: str, data: bytes) -> None:
+    file_dir = os.path.dirname(file_path)
+    if file_dir and not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, file_path)
+
+
+def remove_file(file_path: str) -> None:
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def get_compressed_suffixes():
+    return [".gz"] + ([".br"] if brotli is not None else [])
+
+
+def get_compressed_files(data: bytes):
+    # The gzip header would otherwise contain the current time, and change with every build.
+    compressed_files = { ".gz": gzip.compress(data, compresslevel=9, mtime=0) }
+    if brotli is not None:
+        compressed_files[".br"] = brotli.compress(data, quality=11)
+    return compressed_files
+
+
+def publish_file(api_path: str, relative_path: str, data: bytes, etags) -> bool:
+    # Returns True if the file was written, False if it was up to date.
+    file_path = os.path.join(api_path, relative_path)
+    up_to_date = False
+    if is_published(api_path, relative_path):
+        with open(file_path, 'rb') as f:
+            up_to_date = f.read() == data
+
+    etags[relative_path] = get_etag(data)
+    if up_to_date:
+        # ETags of compressed files are kept in the state, unless it was lost.
+        for suffix in get_compressed_suffixes():
+            if f"{relative_path}{suffix}" not in etags:
+                with open(f"{file_path}{suffix}", 'rb') as f:
+                    etags[f"{relative_path}{suffix}"] = get_etag(f.read())
+        return False
+
+    # Compressed files go first, so they're never older than the file they were made from.
+    for suffix, compressed_data in get_compressed_files(data).items():
+        write_file(f"{file_path}{suffix}", compressed_data)
+        etags[f"{relative_path}{suffix}"] = get_etag(compressed_data)
+    if brotli is None:
+        # Left over from a build with brotli, and no longer matching.
+        remove_file(f"{file_path}.br")
+    write_file(file_path, data)
+    return True
+
+
+def is_published(api_path: str, relative_path: str) -> bool:
+    file_path = os.path.join(api_path, relative_path)
+    return all(os.path.exists(f"{file_path}{suffix}") for suffix in [""] + get_compressed_suffixes())
+
+
+def unpublish_file(api_path: str, relative_path: str, etags) -> None:
+    file_path = os.path.join(api_path, relative_path)
+    for suffix in ["", ".gz", ".br"]:
+        remove_file(f"{file_path}{suffix}")
+        etags.pop(f"{relative_path}{suffix}", None)
+
+
+# Shards.
+
+def get_release_entry(release_filename: str, release_path: str):
+    header = read_release_header(release_path)
+    release_version = get_release_version(header["version"], header["status"])
+    stat = os.stat(release_path)
+
+    # Unusual statuses (e.g. custom builds) don't belong to any channel.
+    channel = release_version.status_prefix
+    if channel not in STATUS_RANKS:
+        channel = ""
+
+    return {
+        "filename": release_filename,
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "name": header["name"],
+        "version": header["version"],
+        "status": header["status"],
+        "release_date": int(header["release_date"]),
+        "git_reference": header["git_reference"],
+        "branch": release_version.branch,
+        "channel": channel,
+    }
+
+
+def sort_entries(entries):
+    return sorted(entries, key=lambda x: get_release_version(x["version"], x["status"]).sort_key)
+
+
+def build_branch_shard(releases_path: str, branch: str, entries) -> bytes:
+    releases = []
+    for entry in sort_entries(entries):
+        files = load_release_files(os.path.join(releases_path, entry["filename"]))
+        releases.append({
+            "name": entry["name"],
+            "version": entry["version"],
+            "status": entry["status"],
+            "release_date": entry["release_date"],
+            "git_reference": entry["git_reference"],
+            "files": [{ "filename": file.filename, "checksum": file.checksum } for file in files],
+        })
+
+    return encode_json({ "format": API_FORMAT, "branch": branch, "releases": releases })
+
+
+def build_channel_shard(channel: str, entries) -> bytes:
+    releases = []
+    for entry in sort_entries(entries):
+        releases.append({
+            "name": entry["name"],
+            "version": entry["version"],
+            "status": entry["status"],
+            "release_date": entry["release_date"],
+            "branch": entry["branch"],
+        })
+
+    return encode_json({ "format": API_FORMAT, "channel": channel, "releases": releases })
+
+
+def build_root_index(api_path: str, branch_entries, channel_entries, etags) -> bytes:
+    def get_shard_info(relative_path: str, entries):
+        return {
+            "path": relative_path,
+            "etag": etags[relative_path],
+            "size": os.path.getsize(os.path.join(api_path, relative_path)),
+            "releases": len(entries),
+            # Releases are sorted by version, so the last one is the latest.
+            "latest": sort_entries(entries)[-1]["name"],
+        }
+
+    index = { "format": API_FORMAT, "branches": {}, "channels": {} }
+    for branch, entries in branch_entries.items():
+        index["branches"][branch] = get_shard_info(get_branch_path(branch), entries)
+    for channel, entries in channel_entries.items():
+        index["channels"][channel] = get_shard_info(get_channel_path(channel), entries)
+
+    return encode_json(index)
+
+
+# State.
+
+def read_state(state_path: str):
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if state.get("format") != API_FORMAT:
+        return None
+    return state
+
+
+def write_state(state_path: str, state) -> None:
+    write_file(state_path, encode_json(state))
+
+
+def build_api(releases_path: str, api_path: str, state_path: str, full: bool = False):
+    # Returns the numbers of written and up-to-date files.
+    state = None if full else read_state(state_path)
+    if state is None:
+        state = { "format": API_FORMAT, "releases": {}, "etags": {} }
+        full = True
+
+    entries = state["releases"]
+    etags = state["etags"]
+    affected_branches = set()
+    affected_channels = set()
+
+    def mark_affected(entry) -> None:
+        affected_branches.add(entry["branch"])
+        if entry["channel"]:
+            affected_channels.add(entry["channel"])
+
+    # Only release files are stat'ed here, their contents are read for added or changed releases.
+    found_filenames = set()
+    for dir_entry in os.scandir(releases_path):
+        if not dir_entry.is_file() or not dir_entry.name.endswith(".json"):
+            continue
+        found_filenames.add(dir_entry.name)
+
+        stat = dir_entry.stat()
+        entry = entries.get(dir_entry.name)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            continue
+
+        if entry is not None:
+            mark_affected(entry)
+        entry = entries[dir_entry.name] = get_release_entry(dir_entry.name, dir_entry.path)
+        mark_affected(entry)
+
+    for release_filename in sorted(set(entries) - found_filenames):
+        mark_affected(entries.pop(release_filename))
+
+    branch_entries = {}
+    channel_entries = {}
+    for release_filename in sorted(entries):
+        entry = entries[release_filename]
+        branch_entries.setdefault(entry["branch"], []).append(entry)
+        if entry["channel"]:
+            channel_entries.setdefault(entry["channel"], []).append(entry)
+
+    if full:
+        affected_branches.update(branch_entries)
+        affected_channels.update(channel_entries)
+
+    # Shards are also regenerated if they've been removed from the API folder since the last build.
+    for branch in branch_entries:
+        if not is_published(api_path, get_branch_path(branch)):
+            affected_branches.add(branch)
+    for channel in channel_entries:
+        if not is_published(api_path, get_channel_path(channel)):
+            affected_channels.add(channel)
+
+    written_count = 0
+    current_count = 0
+
+    def publish(relative_path: str, data: bytes) -> None:
+        nonlocal written_count, current_count
+        if publish_file(api_path, relative_path, data, etags):
+            written_count += 1
+        else:
+            current_count += 1
+
+    for branch in sorted(affected_branches):
+        if branch in branch_entries:
+            publish(get_branch_path(branch), build_branch_shard(releases_path, branch, branch_entries[branch]))
+        else:
+            unpublish_file(api_path, get_branch_path(branch), etags)
+
+    for channel in sorted(affected_channels):
+        if channel in channel_entries:
+            publish(get_channel_path(channel), build_channel_shard(channel, channel_entries[channel]))
+        else:
+            unpublish_file(api_path, get_channel_path(channel), etags)
+
+    publish(INDEX_FILENAME, build_root_index(api_path, branch_entries, channel_entries, etags))
+
+    # The list of ETags can't contain its own.
+    published_etags = { path: etag for path, etag in etags.items() if not path.startswith(ETAGS_FILENAME) }
+    publish(ETAGS_FILENAME, encode_json(published_etags))
+
+    write_state(state_path, state)
+    return written_count, current_count
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Generate the API, or update the shards of changed releases.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    build_parser.add_argument("-o", "--output", default=DEFAULT_API_PATH, help=f"Path to the API folder (defaults to {DEFAULT_API_PATH}).")
+    build_parser.add_argument("--state", default=DEFAULT_STATE_PATH, help=f"Path to the build state, kept outside of the API folder (defaults to {DEFAULT_STATE_PATH}).")
+    build_parser.add_argument("--full", action="store_true", help="Regenerate every shard, instead of only those of changed releases.")
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.releases):
+        print(f"Failed to build the release API: Cannot find the releases folder at '{args.releases}'.\n")
+        exit(1)
+
+    written_count, current_count = build_api(args.releases, args.output, args.state, args.full)
+    compression = ".gz and .br" if brotli is not None else ".gz"
+    print(f"Written {written_count} API files with {compression} siblings to '{args.output}' ({current_count} up to date).")
+
+
+if __name__ == "__main__":
+    main()
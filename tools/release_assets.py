@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+### Classify release files by platform and build an asset lookup index.
+###
+### Each release file is classified once into a (platform, arch, variant,
+### kind) tuple, e.g. ("linux", "x86_64", "mono", "editor") for the .NET
+### editor for Linux. Filenames changed over the years (x11 became linux,
+### osx became macos, and so on), and classification takes care of that.
+###
+### The index maps each release to its classified files, so finding a file
+### is a dictionary lookup instead of pattern-matching every filename. It is
+### saved as JSON to ./tmp/assets.json by default.
+###
+### Usage: ./release_assets.py build
+### Usage: ./release_assets.py find 4.3-stable linux x86_64 mono editor
+### Usage: ./release_assets.py classify Godot_v4.3-stable_mono_linux_x86_64.zip
+
+
+import argparse
+import json
+import os
+import re
+
+from release_loader import DEFAULT_RELEASES_PATH, load_releases
+
+
+DEFAULT_INDEX_PATH = "./tmp/assets.json"
+
+# Version of the index format, bump it when the layout changes.
+INDEX_FORMAT = 1
+
+# Platform-specific parts of Godot_v<version>-<status>_*.* filenames, after the
+# mono_ prefix is removed and underscores are replaced with dots (.NET builds use
+# underscores where standard builds use dots), except in x86_ architectures.
+# Values are (platform, arch, kind, variant), where a variant of None is either
+# standard or mono.
+EDITOR_ASSETS = {
+    # Linux (called X11 before 4.0).
+    "linux.x86_64.zip": ("linux", "x86_64", "editor", None),
+    "linux.64.zip": ("linux", "x86_64", "editor", None),
+    "x11.64.zip": ("linux", "x86_64", "editor", None),
+    "linux.x86_32.zip": ("linux", "x86_32", "editor", None),
+    "linux.32.zip": ("linux", "x86_32", "editor", None),
+    "x11.32.zip": ("linux", "x86_32", "editor", None),
+    "linux.arm64.zip": ("linux", "arm64", "editor", None),
+    "linux.arm32.zip": ("linux", "arm32", "editor", None),
+    "linux.headless.64.zip": ("linux", "x86_64", "headless", None),
+    "linux.server.64.zip": ("linux", "x86_64", "server", None),
+    # Windows.
+    "win64.zip": ("windows", "x86_64", "editor", None),
+    "win32.zip": ("windows", "x86_32", "editor", None),
+    "windows.arm64.zip": ("windows", "arm64", "editor", None),
+    # macOS (called OSX before 4.0).
+    "macos.universal.zip": ("macos", "universal", "editor", None),
+    "osx.universal.zip": ("macos", "universal", "editor", None),
+    "osx.64.zip": ("macos", "x86_64", "editor", None),
+    # Web.
+    "web.editor.zip": ("web", "wasm32", "editor", None),
+    # Android.
+    "android.editor.apk": ("android", "universal", "editor", None),
+    "android.editor.aab": ("android", "universal", "editor_bundle", None),
+    "android.editor.horizonos.apk": ("android", "universal", "editor", "horizonos"),
+    "android.editor.picoos.apk": ("android", "universal", "editor", "picoos"),
+    "android.editor.meta.apk": ("android", "universal", "editor", "meta"),
+    "android.debug.perfetto.apk": ("android", "universal", "template_debug", "perfetto"),
+    "android.release.perfetto.apk": ("android", "universal", "template_release", "perfetto"),
+    "android.source.perfetto.zip": ("android", "any", "source", "perfetto"),
+    # Export templates for all platforms.
+    "export.templates.tpz": ("any", "any", "templates", None),
+}
+
+EDITOR_FILENAME_RE = re.compile(r"Godot_v[^_]+_(mono_)?(.+)")
+LIBRARY_FILENAME_RE = re.compile(r"godot-lib\..+?(\.mono)?\.(template_release|release)(\.perfetto)?\.aar")
+SYMBOLS_FILENAME_RE = re.compile(r"Godot_native_debug_symbols\..+\.(editor|template_release)\.android\.zip")
+SOURCE_FILENAME_RE = re.compile(r"godot-.+\.tar\.xz(\.sha256)?")
+
+
+def classify_file(filename: str):
+    # Returns a (platform, arch, variant, kind) tuple, or None for unknown files.
+    match = EDITOR_FILENAME_RE.fullmatch(filename)
+    if match:
+        asset_key = match.group(2).replace("_", ".").replace("x86.", "x86_").replace(".exe.", ".")
+        asset = EDITOR_ASSETS.get(asset_key)
+        if asset is None:
+            return None
+
+        platform, arch, kind, variant = asset
+        if variant is None:
+            variant = "mono" if match.group(1) else "standard"
+        return (platform, arch, variant, kind)
+
+    match = LIBRARY_FILENAME_RE.fullmatch(filename)
+    if match:
+        variant = "mono" if match.group(1) else "standard"
+        if match.group(3):
+            variant = "perfetto"
+        return ("android", "any", variant, "library")
+
+    match = SYMBOLS_FILENAME_RE.fullmatch(filename)
+    if match:
+        return ("android", "any", "standard", f"{match.group(1)}_symbols")
+
+    match = SOURCE_FILENAME_RE.fullmatch(filename)
+    if match:
+        return ("source", "any", "standard", "source_checksum" if match.group(1) else "source")
+
+    return None
+
+
+def get_asset_key(platform: str, arch: str, variant: str, kind: str) -> str:
+    return f"{platform}/{arch}/{variant}/{kind}"
+
+
+# Index.
+
+class AssetIndex:
+    def __init__(self, releases=None):
+        # Maps release names to asset keys, mapped to [filename, checksum] pairs.
+        self.releases = releases or {}
+
+    def add_release(self, release_name: str, files):
+        # Returns filenames which couldn't be classified.
+        assets = {}
+        unknown_filenames = []
+        for filename, checksum in files:
+            asset = classify_file(filename)
+            if asset is None:
+                unknown_filenames.append(filename)
+                continue
+
+            # Some releases list the same file for both standard and .NET builds,
+            # the first one wins.
+            assets.setdefault(get_asset_key(*asset), [filename, checksum])
+
+        self.releases[release_name] = assets
+        return unknown_filenames
+
+    def find(self, release_name: str, platform: str, arch: str, variant: str, kind: str):
+        # Returns a (filename, checksum) pair, or None.
+        asset = self.releases.get(release_name, {}).get(get_asset_key(platform, arch, variant, kind))
+        return tuple(asset) if asset is not None else None
+
+    def get_assets(self, release_name: str):
+        return self.releases.get(release_name, {})
+
+    def save(self, index_path: str) -> None:
+        index_dir = os.path.dirname(index_path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({ "format": INDEX_FORMAT, "releases": self.releases }, f, separators=(",", ":"), sort_keys=True)
+        os.replace(temp_path, index_path)
+
+
+def build_index(releases_path: str):
+    # Returns the index and a list of (release name, filename) pairs which couldn't be classified.
+    index = AssetIndex()
+    unknown_files = []
+
+    for release in load_releases(releases_path):
+        files = [(file.filename, file.checksum) for file in release.files]
+        for filename in index.add_release(release.name, files):
+            unknown_files.append((release.name, filename))
+        release.unload_files()
+
+    return index, unknown_files
+
+
+def load_index(index_path: str) -> AssetIndex:
+    with open(index_path, 'r') as f:
+        index_data = json.load(f)
+
+    if index_data.get("format") != INDEX_FORMAT:
+        raise ValueError(f"File '{index_path}' has an unsupported index format.")
+
+    return AssetIndex(index_data["releases"])
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--index", default=DEFAULT_INDEX_PATH, help=f"Path to the asset index (defaults to {DEFAULT_INDEX_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the asset index from release metadata files.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+
+    find_parser = subparsers.add_parser("find", help="Print the file of a release matching the given platform, arch, variant, and kind.")
+    find_parser.add_argument("name", help="Release name, e.g. 4.3 or 4.4-beta1.")
+    find_parser.add_argument("platform", help="Platform, e.g. linux, windows, macos, android, web, any.")
+    find_parser.add_argument("arch", help="Architecture, e.g. x86_64, x86_32, arm64, universal, any.")
+    find_parser.add_argument("variant", help="Variant, e.g. standard, mono.")
+    find_parser.add_argument("kind", help="Kind, e.g. editor, templates, library.")
+
+    classify_parser = subparsers.add_parser("classify", help="Print the classification of the given filenames.")
+    classify_parser.add_argument("filenames", nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index, unknown_files = build_index(args.releases)
+        for release_name, filename in unknown_files:
+            print(f"Warning: Cannot classify file '{filename}' of release '{release_name}'.")
+        index.save(args.index)
+        print(f"Written asset index with {len(index.releases)} releases to '{args.index}'.")
+        return
+
+    if args.command == "classify":
+        for filename in args.filenames:
+            asset = classify_file(filename)
+            print(f"{filename}\t{get_asset_key(*asset) if asset else 'unknown'}")
+        return
+
+    if not os.path.isfile(args.index):
+        print(f"Failed to query asset index: Cannot find the index at '{args.index}', build it first.\n")
+        exit(1)
+
+    try:
+        index = load_index(args.index)
+    except (OSError, ValueError) as e:
+        print(f"Failed to query asset index: {e}\n")
+        exit(1)
+
+    # Stable releases are named after their version.
+    release_name = args.name.removesuffix("-stable")
+    asset = index.find(release_name, args.platform, args.arch, args.variant, args.kind)
+    if asset is None:
+        print("No matching file found in the asset index.")
+        exit(1)
+
+    print(f"{asset[1]}  {asset[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+### Shared helpers for processing many releases in one run.
+###
+### A batch manifest lists one release per line, either as comma-separated
+### values or as a JSON object:
+###
+###   4.3,rc1,0123456789abcdef0123456789abcdef01234567
+###   {"version": "4.3", "status": "stable", "git": "77dcf97d82cbfe4e4615475fa52ca03da645dbd8"}
+###
+### The status (flavor) defaults to stable when omitted. Empty lines and lines
+### starting with # are ignored. Use - as the path to read from stdin.
+
+
+import csv
+import json
+import sys
+
+
+class BatchManifestError(Exception):
+    pass
+
+
+def parse_batch_line(line: str, line_number: int):
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            raise BatchManifestError(f"Line {line_number}: Invalid JSON ({e}).")
+
+        # Missing and null values are both empty, rather than the string "None".
+        version = str(entry.get("version") or "")
+        status = str(entry.get("status") or entry.get("flavor") or "")
+        git_reference = str(entry.get("git") or entry.get("git_reference") or "")
+    else:
+        values = [value.strip() for value in next(csv.reader([line]))]
+        if len(values) != 3:
+            raise BatchManifestError(f"Line {line_number}: Expected 3 comma-separated values (version, status, git), got {len(values)}.")
+
+        version, status, git_reference = values
+
+    if version == "" or git_reference == "":
+        raise BatchManifestError(f"Line {line_number}: Godot version and git hash cannot be empty.")
+    if status == "":
+        status = "stable"
+
+    return version, status, git_reference
+
+
+def read_batch_manifest(manifest_path: str):
+    releases = []
+
+    manifest_file = sys.stdin if manifest_path == "-" else open(manifest_path, 'r')
+    try:
+        for line_number, line in enumerate(manifest_file, start=1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            # Allow a CSV header line, which spreadsheets tend to add.
+            if line_number == 1 and line.replace(" ", "").lower().startswith("version,"):
+                continue
+
+            releases.append(parse_batch_line(line, line_number))
+    finally:
+        if manifest_file is not sys.stdin:
+            manifest_file.close()
+
+    return releases
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+
+### Build and query an indexed catalog of all official Godot releases.
+###
+### The catalog is an SQLite database generated from the JSON metadata
+### files in the releases folder. Each file is read once when building,
+### after that releases, checksums, and filenames can be looked up via
+### indexes without scanning the releases folder.
+###
+### The catalog remembers the commit it was built from. Release files are
+### read as they are in that commit, and updating the catalog only applies
+### release files added, changed, or removed since, so it follows committed
+### history rather than uncommitted changes. Outside of Git repositories,
+### the catalog is built from the folder as is, and rebuilt on updates.
+###
+### Usage: ./release_catalog.py build
+### Usage: ./release_catalog.py update
+### Usage: ./release_catalog.py release 4.3-stable
+### Usage: ./release_catalog.py checksum <sha512>
+### Usage: ./release_catalog.py file Godot_v4.3-stable_win64.exe.zip
+
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+
+
+DEFAULT_RELEASES_PATH = "./releases"
+DEFAULT_CATALOG_PATH = "./tmp/catalog.sqlite"
+
+# Checksums are stored as raw 64-byte digests to keep the catalog and its indexes compact.
+CATALOG_SCHEMA = """
+CREATE TABLE releases (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    release_date INTEGER NOT NULL,
+    git_reference TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE files (
+    release_name TEXT NOT NULL REFERENCES releases (name),
+    filename TEXT NOT NULL,
+    checksum BLOB NOT NULL
+);
+CREATE INDEX files_release_name ON files (release_name);
+CREATE INDEX files_filename ON files (filename);
+CREATE INDEX files_checksum ON files (checksum);
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# Git helpers.
+
+def get_git_head(releases_path: str) -> str:
+    result = subprocess.run(["git", "-C", releases_path, "rev-parse", "HEAD"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return ""
+
+    return result.stdout.strip()
+
+
+def find_changed_release_files(releases_path: str, since_commit: str, until_commit: str):
+    # Paths are reported relative to the releases folder, together with their change status (A, M, D).
+    result = subprocess.run(
+        ["git", "-C", releases_path, "diff", "--name-status", "--no-renames", "--relative", since_commit, until_commit, "--", "."],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+
+    changed_files = []
+    for line in result.stdout.splitlines():
+        change_status, filename = line.split("\t", 1)
+        if filename.endswith(".json") and "/" not in filename:
+            changed_files.append((change_status, filename))
+
+    return changed_files
+
+
+def list_committed_release_files(releases_path: str, commit_hash: str):
+    # Filenames are relative to the releases folder, as they were in the given commit.
+    result = subprocess.run(["git", "-C", releases_path, "ls-tree", "--name-only", commit_hash, "--", "."], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    return sorted(filename for filename in result.stdout.splitlines() if filename.endswith(".json") and "/" not in filename)
+
+
+def read_committed_release_files(releases_path: str, commit_hash: str, release_filenames):
+    # Yields (filename, contents) pairs of release files as they were in the given commit, so the
+    # catalog matches the commit it records even with uncommitted changes in the releases folder.
+    # All files are read by a single git process.
+    requests = "".join(f"{commit_hash}:./{filename}\n" for filename in release_filenames)
+    result = subprocess.run(["git", "-C", releases_path, "cat-file", "--batch"], input=requests.encode("utf-8"), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Cannot read release files of commit '{commit_hash}': {result.stderr.decode('utf-8', 'replace').strip()}")
+
+    output = result.stdout
+    position = 0
+    for filename in release_filenames:
+        header_end = output.index(b"\n", position)
+        header = output[position:header_end].split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise RuntimeError(f"Cannot find release file '{filename}' in commit '{commit_hash}'.")
+
+        size = int(header[2])
+        yield filename, output[header_end + 1:header_end + 1 + size]
+        position = header_end + 1 + size + 1
+
+
+# Building.
+
+def list_release_files(releases_path):
+    release_files = []
+
+    for entry in os.scandir(releases_path):
+        if entry.is_file() and entry.name.endswith(".json"):
+            release_files.append(entry.name)
+
+    release_files.sort()
+    return release_files
+
+
+def read_release_files(releases_path: str, release_filenames):
+    # Working tree counterpart of read_committed_release_files, used outside of Git repositories.
+    for filename in release_filenames:
+        with open(os.path.join(releases_path, filename), 'rb') as f:
+            yield filename, f.read()
+
+
+def insert_release(connection, release_filename: str, release_contents: bytes) -> None:
+    release_data = json.loads(release_contents)
+
+    connection.execute(
+        "INSERT INTO releases (name, version, status, release_date, git_reference, path) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            release_data["name"],
+            release_data["version"],
+            release_data["status"],
+            release_data["release_date"],
+            release_data["git_reference"],
+            release_filename,
+        )
+    )
+    connection.executemany(
+        "INSERT INTO files (release_name, filename, checksum) VALUES (?, ?, ?)",
+        [(release_data["name"], file["filename"], bytes.fromhex(file["checksum"])) for file in release_data["files"]]
+    )
+
+
+def delete_release(connection, release_filename: str) -> None:
+    release_row = connection.execute("SELECT name FROM releases WHERE path = ?", (release_filename,)).fetchone()
+    if release_row is None:
+        return
+
+    connection.execute("DELETE FROM files WHERE release_name = ?", (release_row[0],))
+    connection.execute("DELETE FROM releases WHERE name = ?", (release_row[0],))
+
+
+def set_catalog_commit(connection, commit_hash: str) -> None:
+    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('commit', ?)", (commit_hash,))
+
+
+def get_catalog_commit(connection) -> str:
+    meta_row = connection.execute("SELECT value FROM meta WHERE key = 'commit'").fetchone()
+    if meta_row is None:
+        return ""
+
+    return meta_row[0]
+
+
+def build_catalog(releases_path: str, catalog_path: str) -> int:
+    catalog_dir = os.path.dirname(catalog_path)
+    if catalog_dir and not os.path.exists(catalog_dir):
+        os.makedirs(catalog_dir)
+
+    # Build into a temporary database, so readers never see a partially built catalog.
+    temp_path = f"{catalog_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    # Release files are read from the current commit, or from the folder when it's not in a Git
+    # repository. No commit is recorded then, so the next update rebuilds the catalog.
+    commit_hash = get_git_head(releases_path)
+    release_files = list_committed_release_files(releases_path, commit_hash) if commit_hash else None
+    if release_files is None:
+        commit_hash = ""
+        release_files = list_release_files(releases_path)
+        release_contents = read_release_files(releases_path, release_files)
+    else:
+        release_contents = read_committed_release_files(releases_path, commit_hash, release_files)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(CATALOG_SCHEMA)
+        with connection:
+            for release_filename, contents in release_contents:
+                insert_release(connection, release_filename, contents)
+            set_catalog_commit(connection, commit_hash)
+    finally:
+        connection.close()
+
+    os.replace(temp_path, catalog_path)
+    return len(release_files)
+
+
+# Applies release files changed since the last update, or rebuilds the catalog when that's not possible.
+# Returns the number of applied release files and whether the catalog was rebuilt.
+def update_catalog(releases_path: str, catalog_path: str):
+    commit_hash = get_git_head(releases_path)
+    if not os.path.isfile(catalog_path) or not commit_hash:
+        return build_catalog(releases_path, catalog_path), True
+
+    connection = sqlite3.connect(catalog_path)
+    try:
+        catalog_commit = get_catalog_commit(connection)
+        changed_files = None
+        if catalog_commit:
+            changed_files = find_changed_release_files(releases_path, catalog_commit, commit_hash)
+    except sqlite3.DatabaseError:
+        connection.close()
+        return build_catalog(releases_path, catalog_path), True
+
+    # The last processed commit is unknown or not reachable anymore, e.g. after a history rewrite.
+    if changed_files is None:
+        connection.close()
+        return build_catalog(releases_path, catalog_path), True
+
+    added_filenames = [release_filename for change_status, release_filename in changed_files if change_status != "D"]
+    try:
+        with connection:
+            for _, release_filename in changed_files:
+                delete_release(connection, release_filename)
+            for release_filename, contents in read_committed_release_files(releases_path, commit_hash, added_filenames):
+                insert_release(connection, release_filename, contents)
+            set_catalog_commit(connection, commit_hash)
+    finally:
+        connection.close()
+
+    return len(changed_files), False
+
+
+# Querying.
+
+def open_catalog(catalog_path: str):
+    if not os.path.isfile(catalog_path):
+        raise FileNotFoundError(f"Cannot find the release catalog at '{catalog_path}', build it first.")
+
+    connection = sqlite3.connect(f"file:{catalog_path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def find_release(connection, release_name: str):
+    release_row = connection.execute("SELECT * FROM releases WHERE name = ?", (release_name,)).fetchone()
+    if release_row is None:
+        return None
+
+    file_rows = connection.execute("SELECT filename, checksum FROM files WHERE release_name = ? ORDER BY rowid", (release_name,))
+    return {
+        "name": release_row["name"],
+        "version": release_row["version"],
+        "status": release_row["status"],
+        "release_date": release_row["release_date"],
+        "git_reference": release_row["git_reference"],
+        "files": [{ "filename": row["filename"], "checksum": row["checksum"].hex() } for row in file_rows],
+    }
+
+
+def find_checksum(connection, checksum: str):
+    try:
+        digest = bytes.fromhex(checksum)
+    except ValueError:
+        return []
+
+    file_rows = connection.execute("SELECT release_name, filename FROM files WHERE checksum = ? ORDER BY release_name, filename", (digest,))
+    return [{ "release": row["release_name"], "filename": row["filename"] } for row in file_rows]
+
+
+def find_filename(connection, filename: str):
+    file_rows = connection.execute("SELECT release_name, checksum FROM files WHERE filename = ? ORDER BY release_name", (filename,))
+    return [{ "release": row["release_name"], "checksum": row["checksum"].hex() } for row in file_rows]
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--catalog", default=DEFAULT_CATALOG_PATH, help=f"Path to the catalog database (defaults to {DEFAULT_CATALOG_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the catalog from release metadata files.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+
+    update_parser = subparsers.add_parser("update", help="Apply release metadata files changed in Git since the last build or update.")
+    update_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+
+    release_parser = subparsers.add_parser("release", help="Print metadata of a release, e.g. 4.3-stable or 4.4-beta1.")
+    release_parser.add_argument("name")
+
+    checksum_parser = subparsers.add_parser("checksum", help="Print releases and filenames with the given SHA-512 checksum.")
+    checksum_parser.add_argument("checksum")
+
+    file_parser = subparsers.add_parser("file", help="Print releases containing the given filename.")
+    file_parser.add_argument("filename")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            release_count = build_catalog(args.releases, args.catalog)
+        except RuntimeError as e:
+            print(f"Failed to build release catalog: {e}\n")
+            exit(1)
+        print(f"Written catalog of {release_count} releases to '{args.catalog}'.")
+        return
+
+    if args.command == "update":
+        try:
+            release_count, rebuilt = update_catalog(args.releases, args.catalog)
+        except RuntimeError as e:
+            print(f"Failed to update release catalog: {e}\n")
+            exit(1)
+        if rebuilt:
+            print(f"Rebuilt catalog of {release_count} releases in '{args.catalog}'.")
+        else:
+            print(f"Applied {release_count} changed releases to '{args.catalog}'.")
+        return
+
+    try:
+        connection = open_catalog(args.catalog)
+    except FileNotFoundError as e:
+        print(f"Failed to query release catalog: {e}\n")
+        exit(1)
+
+    result = None
+    if args.command == "release":
+        # Stable releases are named after their version only.
+        result = find_release(connection, args.name.removesuffix("-stable"))
+    elif args.command == "checksum":
+        result = find_checksum(connection, args.checksum.lower())
+    elif args.command == "file":
+        result = find_filename(connection, args.filename)
+
+    connection.close()
+
+    if not result:
+        print("No matching entries found in the release catalog.")
+        exit(1)
+
+    print(json.dumps(result, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+### Compute what changed between two releases.
+###
+### Filenames are normalized by replacing the version and status of their
+### release with placeholders, e.g. both Godot_v4.3-rc1_win64.exe.zip and
+### Godot_v4.3-rc2_win64.exe.zip become Godot_v{version}-{status}_win64.exe.zip.
+### Files are then matched by their normalized name, and the delta lists:
+###   added:     files only in the newer release,
+###   removed:   files only in the older release,
+###   changed:   matching files with a different checksum,
+###   unchanged: matching files with the same checksum, which can be reused.
+###
+### The build command precomputes deltas between each release and the one
+### preceding it in version order (see release_model.py), and only rewrites
+### deltas whose releases have changed since. Deltas of releases which are
+### no longer adjacent, e.g. after a release was added between them, are
+### removed.
+###
+### Usage: ./release_deltas.py diff 4.3-rc1 4.3-rc2
+### Usage: ./release_deltas.py build -o ./tmp/deltas
+
+
+import argparse
+import json
+import os
+import re
+
+from release_loader import DEFAULT_RELEASES_PATH, get_release_path, load_release, load_releases
+
+
+DEFAULT_DELTAS_PATH = "./tmp/deltas"
+
+
+def get_normalized_filenames(release):
+    # Filenames use both dashes and dots between the version and the status,
+    # e.g. Godot_v4.3-stable_win64.exe.zip and godot-lib.4.3.stable.template_release.aar.
+    tag_re = re.compile(rf"{re.escape(release.version)}([-.]){re.escape(release.status)}")
+
+    normalized_filenames = {}
+    for index, filename in enumerate(release.files.filenames):
+        normalized_filename = tag_re.sub(r"{version}\1{status}", filename)
+        normalized_filename = normalized_filename.replace(release.version, "{version}")
+        # The same file can be listed for both standard and .NET builds, the first one wins.
+        normalized_filenames.setdefault(normalized_filename, index)
+
+    return normalized_filenames
+
+
+def compute_delta(from_release, to_release):
+    from_files = get_normalized_filenames(from_release)
+    to_files = get_normalized_filenames(to_release)
+
+    delta = {
+        "from": from_release.name,
+        "to": to_release.name,
+        "added": [],
+        "removed": [],
+        "changed": [],
+        "unchanged": [],
+    }
+
+    for normalized_filename, to_index in to_files.items():
+        filename = to_release.files.filenames[to_index]
+        digest = to_release.files.get_digest(to_index)
+
+        from_index = from_files.get(normalized_filename)
+        if from_index is None:
+            delta["added"].append([filename, digest.hex()])
+        elif from_release.files.get_digest(from_index) == digest:
+            delta["unchanged"].append([from_release.files.filenames[from_index], filename])
+        else:
+            delta["changed"].append([from_release.files.filenames[from_index], filename, digest.hex()])
+
+    for normalized_filename, from_index in from_files.items():
+        if normalized_filename not in to_files:
+            delta["removed"].append(from_release.files.filenames[from_index])
+
+    return delta
+
+
+def get_delta_path(deltas_path: str, from_name: str, to_name: str) -> str:
+    return os.path.join(deltas_path, f"{from_name}..{to_name}.json")
+
+
+def write_delta(delta_path: str, delta) -> None:
+    temp_path = f"{delta_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(delta, f, separators=(",", ":"))
+    os.replace(temp_path, delta_path)
+
+
+def build_deltas(releases_path: str, deltas_path: str):
+    # Returns the numbers of written, up-to-date, and removed deltas.
+    if not os.path.exists(deltas_path):
+        os.makedirs(deltas_path)
+
+    releases = load_releases(releases_path)
+    releases.sort(key=lambda x: x.release_version)
+
+    written_count = 0
+    current_count = 0
+    delta_paths = set()
+    for from_release, to_release in zip(releases, releases[1:]):
+        delta_path = get_delta_path(deltas_path, from_release.name, to_release.name)
+        delta_paths.add(delta_path)
+
+        # Deltas only need to be recomputed when one of their releases has been changed.
+        if os.path.isfile(delta_path):
+            delta_mtime = os.path.getmtime(delta_path)
+            if delta_mtime >= os.path.getmtime(from_release.path) and delta_mtime >= os.path.getmtime(to_release.path):
+                current_count += 1
+                continue
+
+        write_delta(delta_path, compute_delta(from_release, to_release))
+        written_count += 1
+
+        # Each release takes part in two deltas, so it can be unloaded after its second one.
+        from_release.unload_files()
+
+    removed_count = 0
+    for entry in os.scandir(deltas_path):
+        if entry.is_file() and entry.name.endswith(".json") and ".." in entry.name and entry.path not in delta_paths:
+            os.remove(entry.path)
+            removed_count += 1
+
+    return written_count, current_count, removed_count
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser("diff", help="Print the delta between two releases.")
+    diff_parser.add_argument("from_name", help="Older release, e.g. 4.3-rc1.")
+    diff_parser.add_argument("to_name", help="Newer release, e.g. 4.3-rc2 or 4.3.")
+    diff_parser.add_argument("--json", action="store_true", help="Print the delta in JSON format.")
+
+    build_parser = subparsers.add_parser("build", help="Precompute deltas between each release and the one preceding it.")
+    build_parser.add_argument("-o", "--output", default=DEFAULT_DELTAS_PATH, help=f"Path to the folder with deltas (defaults to {DEFAULT_DELTAS_PATH}).")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        written_count, current_count, removed_count = build_deltas(args.releases, args.output)
+        print(f"Written {written_count} release deltas to '{args.output}' ({current_count} up to date, {removed_count} removed).")
+        return
+
+    releases = []
+    for name in [args.from_name, args.to_name]:
+        release_path = get_release_path(args.releases, name)
+        if not os.path.isfile(release_path):
+            print(f"Failed to compute release delta: Cannot find release metadata at '{release_path}'.\n")
+            exit(1)
+        releases.append(load_release(release_path))
+
+    delta = compute_delta(*releases)
+
+    if args.json:
+        print(json.dumps(delta, indent=4))
+        return
+
+    for filename, _ in delta["added"]:
+        print(f"ADDED: {filename}")
+    for filename in delta["removed"]:
+        print(f"REMOVED: {filename}")
+    for from_filename, filename, _ in delta["changed"]:
+        print(f"CHANGED: {from_filename} -> {filename}")
+    for from_filename, filename in delta["unchanged"]:
+        print(f"UNCHANGED: {from_filename} -> {filename}")
+
+    print(
+        f"Release '{delta['to']}' compared to '{delta['from']}': "
+        f"{len(delta['added'])} added, {len(delta['removed'])} removed, "
+        f"{len(delta['changed'])} changed, {len(delta['unchanged'])} unchanged."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+### Load release metadata lazily and in a compact form.
+###
+### Release files in the releases folder are memory-mapped and only their
+### header fields (name, version, status, date, git reference) are decoded
+### when loading. The list of files is decoded on first access and stored
+### as a tuple of filenames and a single buffer of raw 64-byte SHA-512
+### digests, instead of a dictionary per file.
+###
+### Usage: ./release_loader.py
+### Usage: ./release_loader.py 4.3-stable
+
+
+import argparse
+import json
+import mmap
+import os
+from collections.abc import Sequence
+
+from release_model import ReleaseVersion, get_release_version
+
+
+DEFAULT_RELEASES_PATH = "./releases"
+DIGEST_SIZE = 64
+
+
+class ReleaseFile:
+    __slots__ = ("filename", "digest")
+
+    def __init__(self, filename: str, digest: bytes):
+        self.filename = filename
+        self.digest = digest
+
+    @property
+    def checksum(self) -> str:
+        return self.digest.hex()
+
+    def __repr__(self) -> str:
+        return f"ReleaseFile({self.filename!r}, {self.checksum[:16]}...)"
+
+
+class ReleaseFiles(Sequence):
+    __slots__ = ("filenames", "digests")
+
+    def __init__(self, filenames, digests: bytes):
+        self.filenames = filenames
+        self.digests = digests
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self.filenames)
+        if index < 0 or index >= len(self.filenames):
+            raise IndexError("release file index out of range")
+
+        return ReleaseFile(self.filenames[index], self.get_digest(index))
+
+    def get_digest(self, index: int) -> bytes:
+        return self.digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+
+    def find_filename(self, filename: str):
+        for index, file_filename in enumerate(self.filenames):
+            if file_filename == filename:
+                return self[index]
+
+        return None
+
+    def find_digest(self, digest: bytes):
+        # Digests are fixed-width, so only matches at record boundaries count.
+        position = self.digests.find(digest)
+        while position != -1:
+            if position % DIGEST_SIZE == 0:
+                return self[position // DIGEST_SIZE]
+            position = self.digests.find(digest, position + 1)
+
+        return None
+
+
+class Release:
+    __slots__ = ("path", "name", "version", "status", "release_date", "git_reference", "_files")
+
+    def __init__(self, path: str, header):
+        self.path = path
+        self.name = header["name"]
+        self.version = header["version"]
+        self.status = header["status"]
+        self.release_date = header["release_date"]
+        self.git_reference = header["git_reference"]
+        self._files = None
+
+    @property
+    def tag(self) -> str:
+        return f"{self.version}-{self.status}"
+
+    @property
+    def release_version(self) -> ReleaseVersion:
+        return get_release_version(self.version, self.status)
+
+    @property
+    def files(self) -> ReleaseFiles:
+        if self._files is None:
+            self._files = load_release_files(self.path)
+        return self._files
+
+    @property
+    def files_loaded(self) -> bool:
+        return self._files is not None
+
+    def unload_files(self) -> None:
+        self._files = None
+
+    def __repr__(self) -> str:
+        return f"Release({self.name!r})"
+
+
+# Helpers.
+
+def read_release_header(release_path: str):
+    with open(release_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Release file '{release_path}' is empty.")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as release_map:
+            # The header fields come before the list of files, so we can decode only
+            # that part and close the object ourselves.
+            files_position = release_map.find(b'"files"')
+            if files_position != -1:
+                header_data = release_map[:files_position].rstrip().removesuffix(b",") + b"}"
+                try:
+                    return json.loads(header_data)
+                except ValueError:
+                    pass
+
+            # Fall back to decoding the whole file, e.g. when keys come in a different order.
+            return json.loads(release_map[:])
+
+
+def load_release_files(release_path: str) -> ReleaseFiles:
+    with open(release_path, 'rb') as json_data:
+        release_data = json.load(json_data)
+
+    filenames = []
+    digests = bytearray()
+    for file in release_data["files"]:
+        filenames.append(file["filename"])
+        digests += bytes.fromhex(file["checksum"])
+
+    return ReleaseFiles(tuple(filenames), bytes(digests))
+
+
+def load_release(release_path: str) -> Release:
+    return Release(release_path, read_release_header(release_path))
+
+
+def load_releases(releases_path: str = DEFAULT_RELEASES_PATH):
+    releases = []
+
+    for entry in os.scandir(releases_path):
+        if not entry.is_file() or not entry.name.endswith(".json"):
+            continue
+        releases.append(load_release(entry.path))
+
+    releases.sort(key=lambda x: x.name)
+    return releases
+
+
+def get_release_path(releases_path: str, release_name: str) -> str:
+    # Stable releases are named after their version, but their files have the status in them.
+    if "-" not in release_name:
+        release_name = f"{release_name}-stable"
+
+    return os.path.join(releases_path, f"godot-{release_name}.json")
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    parser.add_argument("name", nargs="?", default="", help="Release to print files of, e.g. 4.3-stable or 4.4-beta1. Lists all releases if omitted.")
+    args = parser.parse_args()
+
+    if args.name == "":
+        for release in load_releases(args.releases):
+            print(f"{release.name}\t{release.status}\t{release.release_date}\t{release.git_reference}")
+        return
+
+    release_path = get_release_path(args.releases, args.name)
+    if not os.path.isfile(release_path):
+        print(f"Failed to load release: Cannot find release metadata at '{release_path}'.\n")
+        exit(1)
+
+    release = load_release(release_path)
+    for file in release.files:
+        print(f"{file.checksum}  {file.filename}")
+
+
+if __name__ == "__main__":
+    main()
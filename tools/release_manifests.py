@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+### Maintain small manifests with the latest releases.
+###
+### Two documents are kept in the manifests folder of this repository:
+###   channels.json: the latest release of each channel (stable, rc, beta,
+###                  alpha, dev) across all versions.
+###   branches.json: the latest release of each channel in each minor branch
+###                  (e.g. 4.3), plus the latest release of the branch overall.
+###
+### They're meant for update checks, which only need to know what's newest
+### without loading every release. create-release-metadata.py updates them
+### after writing a release by comparing it with the current entries, which
+### takes the same time however many releases there are. If the manifests
+### are missing, they are rebuilt from all release metadata files.
+###
+### Usage: ./release_manifests.py build
+### Usage: ./release_manifests.py build -r ./releases -o ./manifests
+
+
+import argparse
+import json
+import os
+
+from release_loader import DEFAULT_RELEASES_PATH, load_releases
+from release_model import STATUS_RANKS, get_release_version
+
+
+DEFAULT_MANIFESTS_PATH = "./manifests"
+
+CHANNELS_MANIFEST = "channels.json"
+BRANCHES_MANIFEST = "branches.json"
+
+
+def get_manifest_entry(release_data):
+    return {
+        "name": release_data["name"],
+        "version": release_data["version"],
+        "status": release_data["status"],
+        "release_date": int(release_data["release_date"]),
+    }
+
+
+def is_newer_entry(entry, current_entry) -> bool:
+    if current_entry is None:
+        return True
+    # A regenerated release replaces its own entry.
+    if entry["name"] == current_entry["name"]:
+        return True
+
+    release_version = get_release_version(entry["version"], entry["status"])
+    current_version = get_release_version(current_entry["version"], current_entry["status"])
+    return release_version > current_version
+
+
+def add_manifest_entry(channels, branches, entry) -> bool:
+    # Returns True if any of the manifests changed.
+    release_version = get_release_version(entry["version"], entry["status"])
+    channel = release_version.status_prefix
+    # Unusual statuses (e.g. custom builds) don't belong to any channel.
+    if channel not in STATUS_RANKS:
+        return False
+
+    changed = False
+    branch_entries = branches.setdefault(release_version.branch, {})
+    for entries, key in [(channels, channel), (branch_entries, channel), (branch_entries, "latest")]:
+        if is_newer_entry(entry, entries.get(key)) and entries.get(key) != entry:
+            entries[key] = entry
+            changed = True
+
+    return changed
+
+
+# Reading and writing.
+
+def write_manifest(manifest_path: str, manifest_data) -> None:
+    # Write to a temporary file first, so a manifest is never served half-written.
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest_data, f, indent=4, sort_keys=True)
+        f.write("\n")
+    os.replace(temp_path, manifest_path)
+
+
+def read_manifests(manifests_path: str):
+    with open(os.path.join(manifests_path, CHANNELS_MANIFEST), 'r') as f:
+        channels = json.load(f)
+    with open(os.path.join(manifests_path, BRANCHES_MANIFEST), 'r') as f:
+        branches = json.load(f)
+
+    return channels, branches
+
+
+def write_manifests(manifests_path: str, channels, branches) -> None:
+    if not os.path.exists(manifests_path):
+        os.makedirs(manifests_path)
+
+    write_manifest(os.path.join(manifests_path, CHANNELS_MANIFEST), channels)
+    write_manifest(os.path.join(manifests_path, BRANCHES_MANIFEST), branches)
+
+
+def build_manifests(releases_path: str, manifests_path: str) -> None:
+    channels = {}
+    branches = {}
+    for release in load_releases(releases_path):
+        add_manifest_entry(channels, branches, get_manifest_entry({
+            "name": release.name,
+            "version": release.version,
+            "status": release.status,
+            "release_date": release.release_date,
+        }))
+
+    write_manifests(manifests_path, channels, branches)
+
+
+def update_manifests(releases_path: str, manifests_path: str, releases_data) -> bool:
+    # Returns True if the manifests were rebuilt from scratch.
+    try:
+        channels, branches = read_manifests(manifests_path)
+    except (OSError, ValueError):
+        build_manifests(releases_path, manifests_path)
+        return True
+
+    changed = False
+    for release_data in releases_data:
+        if add_manifest_entry(channels, branches, get_manifest_entry(release_data)):
+            changed = True
+
+    if changed:
+        write_manifests(manifests_path, channels, branches)
+    return False
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Rebuild the manifests from all release metadata files.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    build_parser.add_argument("-o", "--output", default=DEFAULT_MANIFESTS_PATH, help=f"Path to the folder with manifests (defaults to {DEFAULT_MANIFESTS_PATH}).")
+
+    args = parser.parse_args()
+
+    build_manifests(args.releases, args.output)
+    print(f"Written release manifests to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+### Shared model of Godot release versions.
+###
+### A release is identified by its version (e.g. 4.3 or 3.2.2) and its
+### status (stable, rc1, beta3, alpha0-unofficial, dev2...). ReleaseVersion
+### parses both once and keeps everything derived from them: the display
+### name used in release notes, the flavor of the release (major, minor or
+### patch), the URL slugs, and a sort key which orders releases the way
+### they were published, i.e. dev < alpha < beta < rc < stable.
+###
+### Instances are immutable and cached, so get_release_version() can be
+### called in loops over thousands of releases without re-parsing anything.
+###
+### Usage: ./release_model.py 4.3-rc1 4.3-stable 4.3-beta2 4.2.2
+
+
+import argparse
+import functools
+import re
+
+
+# Pre-release status prefixes, in the order of their appearance during a release cycle.
+STATUS_PREFIXES = ("dev", "alpha", "beta", "rc")
+STATUS_RANKS = {
+    "dev": 1,
+    "alpha": 2,
+    "beta": 3,
+    "rc": 4,
+    "stable": 5,
+}
+STATUS_LABELS = {
+    "dev": "dev",
+    "alpha": "alpha",
+    "beta": "beta",
+    "rc": "RC",
+}
+
+_STATUS_NUMBER_RE = re.compile(r"(\d*)(.*)")
+
+
+def parse_version_bits(version: str):
+    version_bits = []
+    for bit in version.split("."):
+        # Keep unexpected versions sortable instead of failing on them.
+        version_bits.append(int(bit) if bit.isdigit() else -1)
+
+    return tuple(version_bits)
+
+
+@functools.total_ordering
+class ReleaseVersion:
+    __slots__ = (
+        "version",
+        "status",
+        "version_bits",
+        "flavor",
+        "status_prefix",
+        "status_number",
+        "status_suffix",
+        "name",
+        "tag",
+        "display_name",
+        "version_slug",
+        "status_slug",
+        "sort_key",
+    )
+
+    def __init__(self, version: str, status: str = "stable"):
+        status = status or "stable"
+        version_bits = parse_version_bits(version)
+
+        # Major and minor releases have two components, x.0 and x.y respectively.
+        version_parts = version.split(".")
+        flavor = "patch"
+        if len(version_parts) == 2 and version_parts[1] == "0":
+            flavor = "major"
+        elif len(version_parts) == 2:
+            flavor = "minor"
+
+        status_prefix = ""
+        status_number = -1
+        status_suffix = status
+        for prefix in STATUS_PREFIXES:
+            if status.startswith(prefix):
+                status_prefix = prefix
+                number, status_suffix = _STATUS_NUMBER_RE.fullmatch(status.removeprefix(prefix)).groups()
+                status_number = int(number) if number else -1
+                break
+        if status == "stable":
+            status_prefix = "stable"
+            status_suffix = ""
+
+        if status == "stable":
+            display_name = version
+            status_slug = ""
+        elif status_prefix:
+            status_remainder = status.removeprefix(status_prefix)
+            display_name = f"{version} {STATUS_LABELS[status_prefix]} {status_remainder}"
+            status_slug = f"{status_prefix}-{status_remainder.replace('.', '-')}"
+        else:
+            display_name = f"{version} {status}"
+            status_slug = status.replace(".", "-")
+
+        # Pad versions, so 4.3 and 4.3.0 sort the same; raw strings only break ties.
+        padded_bits = version_bits + (0,) * (4 - len(version_bits))
+
+        set_field = super().__setattr__
+        set_field("version", version)
+        set_field("status", status)
+        set_field("version_bits", version_bits)
+        set_field("flavor", flavor)
+        set_field("status_prefix", status_prefix)
+        set_field("status_number", status_number)
+        set_field("status_suffix", status_suffix)
+        set_field("name", version if status == "stable" else f"{version}-{status}")
+        set_field("tag", f"{version}-{status}")
+        set_field("display_name", display_name)
+        set_field("version_slug", version.replace(".", "-"))
+        set_field("status_slug", status_slug)
+        set_field("sort_key", (padded_bits, STATUS_RANKS.get(status_prefix, 0), status_number, status_suffix, version, status))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+    @property
+    def is_stable(self) -> bool:
+        return self.status == "stable"
+
+    @property
+    def branch(self) -> str:
+        # The major.minor branch the release belongs to, e.g. 4.3 for 4.3.1-rc1.
+        return ".".join(self.version.split(".")[:2])
+
+    def __eq__(self, other):
+        if not isinstance(other, ReleaseVersion):
+            return NotImplemented
+        return self.sort_key == other.sort_key
+
+    def __lt__(self, other):
+        if not isinstance(other, ReleaseVersion):
+            return NotImplemented
+        return self.sort_key < other.sort_key
+
+    def __hash__(self) -> int:
+        return hash(self.sort_key)
+
+    def __reduce__(self):
+        return (get_release_version, (self.version, self.status))
+
+    def __str__(self) -> str:
+        return self.tag
+
+    def __repr__(self) -> str:
+        return f"ReleaseVersion({self.version!r}, {self.status!r})"
+
+
+# Helpers.
+
+@functools.lru_cache(maxsize=None)
+def get_release_version(version: str, status: str = "stable") -> ReleaseVersion:
+    return ReleaseVersion(version, status)
+
+
+def parse_release_name(release_name: str) -> ReleaseVersion:
+    # Accepts release names (4.3, 4.4-beta1) as well as tags (4.3-stable).
+    version, _, status = release_name.partition("-")
+    return get_release_version(version, status or "stable")
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="+", help="Releases to describe, e.g. 4.3-stable or 4.4-beta1.")
+    args = parser.parse_args()
+
+    for release_version in sorted(parse_release_name(name) for name in args.names):
+        print(f"{release_version.tag}\t{release_version.flavor}\t{release_version.display_name}")
+
+
+if __name__ == "__main__":
+    main()
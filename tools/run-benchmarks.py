@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+### Benchmark the release tooling on synthetic data.
+###
+### Synthetic data is generated from a fixed seed, so runs with the same
+### options are comparable, and nothing is downloaded:
+###   - release metadata corpora with the given multiples of the current
+###     number of releases (343), for loading, sorting, notes, and lookups;
+###   - release folders with random artifacts, their SHA512-SUMS.txt, and
+###     a mono/ subfolder, for create-release-metadata.py.
+###
+### Each benchmark is repeated a few times and the timings are written as
+### JSON. Pass the results of a previous run with --compare to see how the
+### numbers changed.
+###
+### Usage: ./run-benchmarks.py
+### Usage: ./run-benchmarks.py --scales 1 10 100 --artifact-size 4194304 --compare ./tmp/benchmarks/baseline.json
+
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+
+import checksum_index
+import release_model
+from release_loader import load_releases
+from version_index import VersionIndex
+
+
+# Number of releases in this repository at the time of writing, scales are multiples of it.
+BASE_RELEASE_COUNT = 343
+
+# Artifacts of a typical 4.x release, {tag} is replaced with the release's version and status.
+ARTIFACT_TEMPLATES = [
+    "Godot_v{tag}_android_editor.aab",
+    "Godot_v{tag}_android_editor.apk",
+    "Godot_v{tag}_export_templates.tpz",
+    "Godot_v{tag}_linux.arm32.zip",
+    "Godot_v{tag}_linux.arm64.zip",
+    "Godot_v{tag}_linux.x86_32.zip",
+    "Godot_v{tag}_linux.x86_64.zip",
+    "Godot_v{tag}_macos.universal.zip",
+    "Godot_v{tag}_web_editor.zip",
+    "Godot_v{tag}_win32.exe.zip",
+    "Godot_v{tag}_win64.exe.zip",
+    "Godot_v{tag}_windows_arm64.exe.zip",
+    "godot-{tag}.tar.xz",
+    "godot-{tag}.tar.xz.sha256",
+]
+MONO_ARTIFACT_TEMPLATES = [
+    "Godot_v{tag}_mono_export_templates.tpz",
+    "Godot_v{tag}_mono_linux_x86_64.zip",
+    "Godot_v{tag}_mono_macos.universal.zip",
+    "Godot_v{tag}_mono_win64.zip",
+]
+
+# Benchmarks of create-release-metadata.py, which need release folders generated first.
+METADATA_BENCHMARKS = ["metadata_from_sums", "metadata_checksums_cold", "metadata_checksums_cached"]
+
+# Statuses of each minor release cycle, patch releases only get an RC.
+MINOR_STATUSES = ["dev1", "dev2", "alpha1", "beta1", "beta2", "beta3", "rc1", "rc2", "stable"]
+PATCH_STATUSES = ["rc1", "stable"]
+
+
+def load_script(script_name: str):
+    # Scripts have dashes in their names, so they can't be imported normally.
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{script_name}.py")
+    spec = importlib.util.spec_from_file_location(script_name.replace("-", "_"), script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Synthetic data.
+
+def generate_versions(count: int):
+    versions = []
+    major = 1
+    while True:
+        for minor in range(10):
+            for patch in range(4):
+                version = f"{major}.{minor}" if patch == 0 else f"{major}.{minor}.{patch}"
+                for status in (MINOR_STATUSES if patch == 0 else PATCH_STATUSES):
+                    versions.append((version, status))
+                    if len(versions) == count:
+                        return versions
+        major += 1
+
+
+def get_artifact_filenames(version: str, status: str):
+    tag = f"{version}-{status}"
+    return [template.format(tag=tag) for template in ARTIFACT_TEMPLATES], [template.format(tag=tag) for template in MONO_ARTIFACT_TEMPLATES]
+
+
+def generate_corpus(corpus_path: str, release_count: int, seed: int):
+    # Returns the number of generated files.
+    os.makedirs(corpus_path)
+    rng = random.Random(seed)
+
+    file_count = 0
+    release_date = 1400000000
+    for version, status in generate_versions(release_count):
+        release_date += rng.randint(3600, 14 * 86400)
+        filenames, mono_filenames = get_artifact_filenames(version, status)
+
+        release_data = {
+            "name": version if status == "stable" else f"{version}-{status}",
+            "version": version,
+            "status": status,
+            "release_date": release_date,
+            "git_reference": rng.randbytes(20).hex(),
+            "files": [{ "filename": filename, "checksum": rng.randbytes(64).hex() } for filename in filenames + mono_filenames],
+        }
+        file_count += len(release_data["files"])
+
+        with open(os.path.join(corpus_path, f"godot-{version}-{status}.json"), 'w') as f:
+            json.dump(release_data, f, indent=4)
+
+    return file_count
+
+
+def generate_release_folders(basedir: str, folder_count: int, artifact_count: int, artifact_size: int, seed: int):
+    # Returns (version, status, git hash) tuples, as used by create-release-metadata.py.
+    rng = random.Random(seed)
+    releases = []
+
+    for version, status in generate_versions(folder_count):
+        release_folder = os.path.join(basedir, "releases", f"{version}-{status}")
+        filenames, mono_filenames = get_artifact_filenames(version, status)
+
+        # Repeat the templates if more artifacts are requested than there are templates.
+        folder_filenames = []
+        for index in range(artifact_count):
+            all_filenames = filenames + mono_filenames
+            filename = all_filenames[index % len(all_filenames)]
+            if index >= len(all_filenames):
+                filename = f"{index // len(all_filenames)}_{filename}"
+            folder = os.path.join(release_folder, "mono") if "_mono_" in filename else release_folder
+            folder_filenames.append((folder, filename))
+
+        checksums = {}
+        for folder, filename in folder_filenames:
+            os.makedirs(folder, exist_ok=True)
+            data = rng.randbytes(artifact_size)
+            with open(os.path.join(folder, filename), 'wb') as f:
+                f.write(data)
+            checksums.setdefault(folder, []).append((hashlib.sha512(data).hexdigest(), filename))
+
+        for folder, folder_checksums in checksums.items():
+            with open(os.path.join(folder, "SHA512-SUMS.txt"), 'w') as f:
+                for checksum, filename in sorted(folder_checksums, key=lambda x: x[1].lower()):
+                    f.write(f"{checksum}  {filename}\n")
+
+        releases.append((version, status, rng.randbytes(20).hex()))
+
+    return releases
+
+
+# Benchmarks.
+
+def run_benchmark(function, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        # Scripts print a line for every release, which would only measure the terminal.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start_time)
+
+    return timings
+
+
+def get_corpus_benchmarks(corpus_path: str, work_path: str, lookup_count: int, seed: int):
+    create_release_notes = load_script("create-release-notes")
+    releases = load_releases(corpus_path)
+    for release in releases:
+        release.files
+
+    rng = random.Random(seed)
+    lookup_digests = []
+    for _ in range(lookup_count):
+        release = rng.choice(releases)
+        if rng.random() < 0.9 and len(release.files) > 0:
+            lookup_digests.append(release.files.get_digest(rng.randrange(len(release.files))))
+        else:
+            lookup_digests.append(rng.randbytes(64))
+    lookup_versions = [rng.choice(releases).release_version for _ in range(lookup_count)]
+
+    index_path = os.path.join(work_path, "checksums.bin")
+    checksum_index.build_index(corpus_path, index_path)
+    version_index = VersionIndex((release.release_version, release.release_date) for release in releases)
+
+    def load_headers():
+        load_releases(corpus_path)
+
+    def load_files():
+        for release in load_releases(corpus_path):
+            release.files
+
+    def sort_by_version():
+        # Parse versions from scratch, like a fresh process would.
+        release_model.get_release_version.cache_clear()
+        sorted(releases, key=lambda x: x.release_version)
+
+    def sort_by_date():
+        sorted(releases, key=lambda x: x.release_date)
+
+    def generate_notes():
+        for release in releases:
+            create_release_notes.generate_notes(release.version, release.status, release.git_reference)
+
+    def build_checksum_index():
+        checksum_index.build_index(corpus_path, index_path)
+
+    def find_checksums():
+        with checksum_index.ChecksumIndex(index_path) as index:
+            for digest in lookup_digests:
+                index.find(digest)
+
+    def find_newer_versions():
+        for release_version in lookup_versions:
+            version_index.find_newer(release_version, True)
+            version_index.get_successor(release_version)
+
+    return [
+        ("load_headers", load_headers),
+        ("load_files", load_files),
+        ("sort_by_version", sort_by_version),
+        ("sort_by_date", sort_by_date),
+        ("generate_notes", generate_notes),
+        ("build_checksum_index", build_checksum_index),
+        ("find_checksums", find_checksums),
+        ("find_newer_versions", find_newer_versions),
+    ]
+
+
+def get_metadata_benchmarks(releases, jobs: int, cache_path: str):
+    create_release_metadata = load_script("create-release-metadata")
+
+    def generate_from_sums():
+        create_release_metadata.generate_files(releases, jobs, False, "", 0, 0)
+
+    def generate_checksums_cold():
+        create_release_metadata.generate_files(releases, jobs, True, "", 0, 0)
+
+    def generate_checksums_cached():
+        create_release_metadata.generate_files(releases, jobs, True, cache_path, 10000, 0)
+
+    # Fill the cache, so only cached runs are measured.
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_checksums_cached()
+
+    return list(zip(METADATA_BENCHMARKS, [generate_from_sums, generate_checksums_cold, generate_checksums_cached]))
+
+
+def summarize(name: str, timings, details):
+    return {
+        "name": name,
+        **details,
+        "repeat": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "timings": timings,
+    }
+
+
+def print_result(result, previous_results) -> None:
+    label = f"{result['name']} [{result['data']}]"
+    line = f"{label:<48} median {result['median'] * 1000:10.2f} ms   min {result['min'] * 1000:10.2f} ms"
+
+    previous = previous_results.get((result["name"], result["data"]))
+    if previous is not None and previous["median"] > 0:
+        line += f"   {result['median'] / previous['median']:6.2f}x of previous"
+    print(line)
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help=f"Sizes of metadata corpora, as multiples of {BASE_RELEASE_COUNT} releases (defaults to 1 10 100).")
+    parser.add_argument("--folders", type=int, default=8, help="Number of release folders with artifacts (defaults to 8).")
+    parser.add_argument("--artifacts", type=int, default=len(ARTIFACT_TEMPLATES) + len(MONO_ARTIFACT_TEMPLATES), help="Number of artifacts in each release folder (defaults to one per known artifact).")
+    parser.add_argument("--artifact-size", type=int, default=1024 * 1024, help="Size of each artifact in bytes (defaults to 1 MiB).")
+    parser.add_argument("--lookups", type=int, default=10000, help="Number of checksum and version lookups (defaults to 10000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times each benchmark is run (defaults to 5).")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of parallel jobs for metadata generation (defaults to the number of CPUs).")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generating synthetic data (defaults to 1).")
+    parser.add_argument("--only", default="", help="Only run benchmarks with this substring in their name.")
+    parser.add_argument("--work-dir", default="./tmp/benchmarks/work", help="Folder for synthetic data, cleared on every run (defaults to ./tmp/benchmarks/work).")
+    parser.add_argument("-o", "--output", default="./tmp/benchmarks/results.json", help="Path to write results to (defaults to ./tmp/benchmarks/results.json).")
+    parser.add_argument("--compare", default="", help="Path to results of a previous run to compare with.")
+    args = parser.parse_args()
+
+    previous_results = {}
+    if args.compare:
+        try:
+            with open(args.compare, 'r') as f:
+                for result in json.load(f)["results"]:
+                    previous_results[(result["name"], result["data"])] = result
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to run benchmarks: Cannot read previous results '{args.compare}': {e}\n")
+            exit(1)
+
+    # Only remove what this script creates, in case the work folder was pointed somewhere else.
+    work_path = os.path.abspath(args.work_dir)
+    for folder in ["corpora", "basedir", "buildsdir"]:
+        shutil.rmtree(os.path.join(work_path, folder), ignore_errors=True)
+    os.makedirs(os.path.join(work_path, "buildsdir", "releases"))
+
+    results = []
+
+    def run_benchmarks(benchmarks, details) -> None:
+        for name, function in benchmarks:
+            if args.only not in name:
+                continue
+            result = summarize(name, run_benchmark(function, args.repeat), details)
+            results.append(result)
+            print_result(result, previous_results)
+
+    for scale in args.scales:
+        corpus_path = os.path.join(work_path, "corpora", f"x{scale}")
+        release_count = BASE_RELEASE_COUNT * scale
+        print(f"Generating a corpus of {release_count} releases...")
+        file_count = generate_corpus(corpus_path, release_count, args.seed)
+
+        details = { "data": f"{release_count} releases", "releases": release_count, "files": file_count }
+        run_benchmarks(get_corpus_benchmarks(corpus_path, work_path, args.lookups, args.seed), details)
+
+    if any(args.only in name for name in METADATA_BENCHMARKS):
+        # create-release-metadata.py finds its folders through these.
+        os.environ["basedir"] = os.path.join(work_path, "basedir")
+        os.environ["buildsdir"] = os.path.join(work_path, "buildsdir")
+
+        print(f"Generating {args.folders} release folders with {args.artifacts} artifacts of {args.artifact_size} bytes...")
+        releases = generate_release_folders(os.environ["basedir"], args.folders, args.artifacts, args.artifact_size, args.seed)
+
+        details = {
+            "data": f"{args.folders}x{args.artifacts}x{args.artifact_size} bytes",
+            "releases": args.folders,
+            "files": args.folders * args.artifacts,
+            "bytes": args.folders * args.artifacts * args.artifact_size,
+        }
+        run_benchmarks(get_metadata_benchmarks(releases, args.jobs, os.path.join(work_path, "basedir", "cache.json")), details)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "time": int(time.time()),
+            "results": results,
+        }, f, indent=4)
+
+    print(f"Written benchmark results to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
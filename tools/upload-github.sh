@@ -74,8 +74,13 @@ if ! $buildsdir/tools/create-release-metadata.py -v $godot_version -f $godot_fla
   exit 1
 fi
 
+if ! $buildsdir/tools/validate-releases.py -r $buildsdir/releases $buildsdir/releases/godot-$release_tag.json; then
+  echo "Failed to validate release metadata for $release_tag."
+  exit 1
+fi
+
 cd $buildsdir
-git add ./releases/godot-$release_tag.json
+git add ./releases/godot-$release_tag.json ./manifests
 git commit -m "Add Godot $release_tag"
 git tag $release_tag
 if ! git push --atomic origin main $release_tag; then
@@ -115,18 +120,12 @@ fi
 
 echo "Uploading release files from $version_path..."
 
-# We are picking up all relevant files lazily, using a substring.
-# The first letter can be in either case, so we're skipping it.
-for f in $version_path/*odot*; do
-  echo "Uploading $f..."
-  gh release upload $release_tag $f -R $godot_repository
-done
-
-# Do the same for .NET builds.
-for f in $version_path/mono/*odot*; do
-  echo "Uploading $f..."
-  gh release upload $release_tag $f -R $godot_repository
-done
+# Files listed in the release metadata are uploaded in parallel. Uploads which
+# were completed before are skipped, so the script can be re-run after a failure.
+if ! $buildsdir/tools/upload-release-assets.py -v $godot_version -f $godot_flavor -r $godot_repository -d $version_path --journal $basedir/tmp/upload-journal.jsonl; then
+  echo "Failed to upload release files for $release_tag."
+  exit 1
+fi
 
 # README.txt is only generated for pre-releases.
 readme_path="$version_path/README.txt"
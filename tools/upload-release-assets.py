@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+### Upload release files to an existing GitHub release.
+###
+### Files to upload are taken from the release's metadata file and looked
+### up in the release folder (and its mono/ subfolder) of godot-build-scripts.
+### Several files are uploaded at the same time, each streamed from disk.
+### The size reported by GitHub is checked against the local file, and
+### every finished upload is written to a journal, so running the script
+### again after a failure only uploads what's missing.
+###
+### Usage: ./upload-release-assets.py -v 4.3 -f rc1
+### Usage: ./upload-release-assets.py -v 4.3 -f rc1 -r owner/repository -d ./releases/4.3-rc1
+
+
+import argparse
+import os
+
+from github_releases import DEFAULT_API_URL, DEFAULT_REPOSITORY, GitHubClient, GitHubError, Journal, get_github_token, upload_release_assets
+from release_loader import load_release
+
+
+def find_release_asset_files(release, release_folder: str):
+    asset_files = []
+    missing_filenames = []
+    uploaded_filenames = set()
+
+    for filename in release.files.filenames:
+        # GitHub requires unique asset names, so a filename listed for both standard
+        # and .NET builds can only be uploaded once.
+        if filename in uploaded_filenames:
+            print(f"Warning: Skipping duplicate file '{filename}'.")
+            continue
+
+        for folder in [release_folder, os.path.join(release_folder, "mono")]:
+            file_path = os.path.join(folder, filename)
+            if os.path.isfile(file_path):
+                asset_files.append(file_path)
+                uploaded_filenames.add(filename)
+                break
+        else:
+            missing_filenames.append(filename)
+
+    return asset_files, missing_filenames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--version", default="", help="Godot version in the major.minor.patch format (patch should be omitted for major and minor releases).")
+    parser.add_argument("-f", "--flavor", default="stable", help="Release flavor, e.g. dev, alpha, beta, rc, stable (defaults to stable).")
+    parser.add_argument("-r", "--repository", default=DEFAULT_REPOSITORY, help=f"GitHub repository with the release (defaults to {DEFAULT_REPOSITORY}).")
+    parser.add_argument("-d", "--dir", default="", help="Folder with release files (defaults to releases/<tag> in the basedir).")
+    parser.add_argument("-m", "--metadata", default="", help="Release metadata file (defaults to releases/godot-<tag>.json in the buildsdir).")
+    parser.add_argument("--journal", default="./tmp/upload-journal.jsonl", help="Path to the journal of finished uploads (defaults to ./tmp/upload-journal.jsonl).")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help=f"Base URL of the GitHub API (defaults to {DEFAULT_API_URL}).")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Number of files uploaded in parallel (defaults to 4).")
+    args = parser.parse_args()
+
+    if args.version == "":
+        print("Failed to upload release files: Godot version cannot be empty.\n")
+        parser.print_help()
+        exit(1)
+
+    release_flavor = args.flavor
+    if release_flavor == "":
+        release_flavor = "stable"
+    release_tag = f"{args.version}-{release_flavor}"
+
+    release_folder = args.dir or f"{os.environ.get('basedir', '.')}/releases/{release_tag}"
+    metadata_path = args.metadata or f"{os.environ.get('buildsdir', '.')}/releases/godot-{release_tag}.json"
+    if not os.path.isfile(metadata_path):
+        print(f"Failed to upload release files: Cannot find release metadata at '{metadata_path}'.\n")
+        exit(1)
+    if not os.path.isdir(release_folder):
+        print(f"Failed to upload release files: Cannot find the release folder at '{release_folder}'.\n")
+        exit(1)
+
+    asset_files, missing_filenames = find_release_asset_files(load_release(metadata_path), release_folder)
+    if missing_filenames:
+        for filename in missing_filenames:
+            print(f"Cannot find release file '{filename}' in '{release_folder}'.")
+        print("Failed to upload release files: Some files listed in the release metadata are missing.\n")
+        exit(1)
+
+    token = get_github_token()
+    if not token:
+        print("Failed to upload release files: Set GITHUB_TOKEN or log in with the GitHub CLI (gh auth login).\n")
+        exit(1)
+
+    client = GitHubClient(args.repository, token, args.api_url)
+    journal = Journal(args.journal)
+
+    try:
+        github_release = client.get_release_by_tag(release_tag)
+        if github_release is None:
+            print(f"Failed to upload release files: Cannot find a GitHub release for {release_tag} in {args.repository}.\n")
+            exit(1)
+
+        uploaded_count = upload_release_assets(client, journal, github_release, asset_files, args.jobs)
+    except (GitHubError, OSError) as e:
+        print(f"Failed to upload release files for {release_tag}: {e}\n")
+        exit(1)
+
+    print(f"Uploaded {uploaded_count} of {len(asset_files)} release files for {release_tag}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+### Validate release metadata files before they're committed.
+###
+### Each file in the releases folder is checked for:
+###   - valid JSON, without duplicate keys,
+###   - the expected fields and types, and no unknown fields,
+###   - SHA-512 checksums of 128 lowercase hex digits,
+###   - filenames listed more than once,
+###   - the name and file path agreeing with the version and status,
+###   - filenames containing the version and status of their release.
+###
+### Problems are reported as errors, and unusual but valid cases, like an
+### unknown status, as warnings. Filenames listed twice with different
+### checksums (e.g. godot-lib for standard and .NET builds) are errors,
+### except in the published releases on LEGACY_DUPLICATE_RELEASES.
+###
+### By default, only release files which changed since a Git reference
+### (HEAD, unless --since is given) or are untracked are checked, which
+### makes it cheap to run as a pre-commit hook. Files are validated in
+### parallel processes.
+###
+### Usage: ./validate-releases.py
+### Usage: ./validate-releases.py --since origin/main
+### Usage: ./validate-releases.py --all --strict
+### Usage: ./validate-releases.py ./releases/godot-4.3-stable.json
+
+
+import argparse
+import json
+import os
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from release_loader import DEFAULT_RELEASES_PATH
+from release_model import STATUS_RANKS, get_release_version
+
+
+# Release fields in the order create-release-metadata.py writes them, and their types.
+RELEASE_FIELDS = {
+    "name": str,
+    "version": str,
+    "status": str,
+    "release_date": int,
+    "git_reference": str,
+    "files": list,
+}
+FILE_FIELDS = {
+    "filename": str,
+    "checksum": str,
+}
+
+VERSION_RE = re.compile(r"\d+(\.\d+)+")
+STATUS_RE = re.compile(r"[a-z]+\d*(-[a-z]+)?")
+CHECKSUM_RE = re.compile(r"[0-9a-f]{128}")
+
+# Published releases which list a file of the standard and .NET builds under the same name.
+LEGACY_DUPLICATE_RELEASES = [
+    "3.2.2-beta3",
+    "3.2.2-beta4",
+]
+
+# Below this many files, starting worker processes takes longer than validating them.
+MIN_PARALLEL_FILES = 32
+
+
+class DuplicateKeyError(ValueError):
+    pass
+
+
+def reject_duplicate_keys(pairs):
+    data = {}
+    for key, value in pairs:
+        if key in data:
+            raise DuplicateKeyError(f"Duplicate key '{key}'.")
+        data[key] = value
+    return data
+
+
+def get_version_re(version: str):
+    # Matches the version on its own, so 4.3 doesn't match 4.3.1 or 14.3.
+    return re.compile(rf"(?<!\d)(?<!\d\.){re.escape(version)}(?!\d)(?!\.\d)")
+
+
+def validate_fields(data, fields, location: str, errors) -> bool:
+    # Returns False if the fields are unusable for further checks.
+    if not isinstance(data, dict):
+        errors.append(f"{location} is not an object.")
+        return False
+
+    valid = True
+    for key, field_type in fields.items():
+        if key not in data:
+            errors.append(f"{location} has no '{key}' field.")
+            valid = False
+        # Booleans are also ints in Python.
+        elif not isinstance(data[key], field_type) or isinstance(data[key], bool):
+            errors.append(f"{location} has a '{key}' field of the wrong type, expected {field_type.__name__}.")
+            valid = False
+
+    for key in data:
+        if key not in fields:
+            errors.append(f"{location} has an unknown field '{key}'.")
+
+    return valid
+
+
+def validate_files(release_data, errors, warnings) -> None:
+    version = release_data["version"]
+    status = release_data["status"]
+    version_re = get_version_re(version)
+
+    checksums = {}
+    for index, file in enumerate(release_data["files"]):
+        if not validate_fields(file, FILE_FIELDS, f"File #{index}", errors):
+            continue
+
+        filename = file["filename"]
+        checksum = file["checksum"]
+
+        if filename == "" or "/" in filename or "\\" in filename or filename != filename.strip():
+            errors.append(f"File #{index} has an invalid filename '{filename}'.")
+            continue
+        if not CHECKSUM_RE.fullmatch(checksum):
+            errors.append(f"File '{filename}' has an invalid checksum, expected 128 lowercase hex digits.")
+
+        if filename in checksums:
+            if checksum in checksums[filename]:
+                errors.append(f"File '{filename}' is listed more than once.")
+            elif release_data["name"] in LEGACY_DUPLICATE_RELEASES:
+                warnings.append(f"File '{filename}' is listed more than once, with different checksums.")
+            else:
+                errors.append(f"File '{filename}' is listed more than once, with different checksums.")
+            checksums[filename].append(checksum)
+            continue
+        checksums[filename] = [checksum]
+
+        if not version_re.search(filename):
+            errors.append(f"File '{filename}' doesn't contain the release version '{version}'.")
+        elif status not in filename:
+            warnings.append(f"File '{filename}' doesn't contain the release status '{status}'.")
+
+
+def validate_release_file(release_path: str):
+    # Returns the path and lists of errors and warnings.
+    errors = []
+    warnings = []
+
+    try:
+        with open(release_path, 'rb') as f:
+            release_data = json.loads(f.read().decode("utf-8"), object_pairs_hook=reject_duplicate_keys)
+    except OSError as e:
+        return release_path, [f"Cannot read the file: {e.strerror}."], warnings
+    except UnicodeDecodeError:
+        return release_path, ["File is not valid UTF-8."], warnings
+    except DuplicateKeyError as e:
+        return release_path, [str(e)], warnings
+    except ValueError as e:
+        return release_path, [f"File is not valid JSON: {e}"], warnings
+
+    if not validate_fields(release_data, RELEASE_FIELDS, "Release", errors):
+        return release_path, errors, warnings
+
+    version = release_data["version"]
+    status = release_data["status"]
+
+    if not VERSION_RE.fullmatch(version):
+        errors.append(f"Release has an invalid version '{version}'.")
+    if not STATUS_RE.fullmatch(status):
+        errors.append(f"Release has an invalid status '{status}'.")
+    elif get_release_version(version, status).status_prefix not in STATUS_RANKS:
+        warnings.append(f"Release has an unusual status '{status}'.")
+
+    expected_name = version if status == "stable" else f"{version}-{status}"
+    if release_data["name"] != expected_name:
+        errors.append(f"Release name '{release_data['name']}' doesn't match its version and status, expected '{expected_name}'.")
+
+    expected_filename = f"godot-{version}-{status}.json"
+    if os.path.basename(release_path) != expected_filename:
+        errors.append(f"File name doesn't match the release version and status, expected '{expected_filename}'.")
+
+    if release_data["release_date"] <= 0:
+        errors.append(f"Release has an invalid release date '{release_data['release_date']}'.")
+    if release_data["git_reference"] == "":
+        errors.append("Release has an empty git_reference.")
+
+    validate_files(release_data, errors, warnings)
+    return release_path, errors, warnings
+
+
+# File selection.
+
+def run_git(releases_path: str, arguments):
+    result = subprocess.run(["git", "-C", releases_path] + arguments, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    return result.stdout.splitlines()
+
+
+def find_changed_release_files(releases_path: str, since: str):
+    # Returns paths of release files changed since the given reference, including uncommitted
+    # and untracked ones, or None if the releases folder is not in a Git repository.
+    changed_filenames = run_git(releases_path, ["diff", "--name-only", "--diff-filter=d", "--relative", since, "--", "."])
+    untracked_filenames = run_git(releases_path, ["ls-files", "--others", "--exclude-standard", "--", "."])
+    if changed_filenames is None or untracked_filenames is None:
+        return None
+
+    release_paths = set()
+    for filename in changed_filenames + untracked_filenames:
+        if filename.endswith(".json") and "/" not in filename:
+            release_paths.add(os.path.join(releases_path, filename))
+
+    return sorted(release_paths)
+
+
+def list_release_files(releases_path: str):
+    release_paths = []
+    for entry in os.scandir(releases_path):
+        if entry.is_file() and entry.name.endswith(".json"):
+            release_paths.append(entry.path)
+
+    return sorted(release_paths)
+
+
+def validate_release_files(release_paths, jobs: int):
+    if jobs <= 1 or len(release_paths) < MIN_PARALLEL_FILES:
+        return [validate_release_file(release_path) for release_path in release_paths]
+
+    # Parsing is CPU-bound, so files are spread over processes in batches.
+    chunk_size = max(1, len(release_paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(validate_release_file, release_paths, chunksize=chunk_size))
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", help="Release files to validate, instead of the changed ones.")
+    parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    parser.add_argument("--since", default="HEAD", help="Git reference to validate changed release files since (defaults to HEAD, i.e. uncommitted changes).")
+    parser.add_argument("--all", action="store_true", help="Validate all release files.")
+    parser.add_argument("--strict", action="store_true", help="Fail on warnings too.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Number of processes validating files (defaults to the number of CPUs).")
+    args = parser.parse_args()
+
+    if args.paths:
+        release_paths = args.paths
+    elif not os.path.isdir(args.releases):
+        print(f"Failed to validate releases: Cannot find the releases folder at '{args.releases}'.\n")
+        exit(1)
+    elif args.all:
+        release_paths = list_release_files(args.releases)
+    else:
+        release_paths = find_changed_release_files(args.releases, args.since)
+        if release_paths is None:
+            print(f"Failed to validate releases: Cannot list changes since '{args.since}' with Git, use --all or give release files instead.\n")
+            exit(1)
+
+    error_count = 0
+    warning_count = 0
+    for release_path, errors, warnings in validate_release_files(release_paths, args.jobs):
+        for message in errors:
+            print(f"ERROR: {release_path}: {message}")
+        for message in warnings:
+            print(f"WARNING: {release_path}: {message}")
+        error_count += len(errors)
+        warning_count += len(warnings)
+
+    print(f"Validated {len(release_paths)} release files: {error_count} errors, {warning_count} warnings.")
+
+    if error_count or (args.strict and warning_count):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+### Verify downloaded release files against their recorded checksums.
+###
+### Every file in the given directory (including subdirectories, such as
+### mono/) is hashed and compared with the SHA-512 checksum recorded in
+### releases/godot-<release>.json. Files are hashed in parallel threads
+### with large read buffers, which lets hashing keep up with fast disks.
+###
+### Usage: ./verify-release-files.py -r 4.3-stable -d ./downloads
+### Usage: ./verify-release-files.py -r 4.4-beta1 -d ./downloads --json
+
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from file_checksums import compute_file_checksum
+from release_loader import DEFAULT_RELEASES_PATH, get_release_path, load_release
+
+
+VERIFY_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Files published with each release which are not listed in its metadata.
+IGNORED_FILENAMES = [
+    "README.txt",
+    "SHA512-SUMS.txt",
+]
+
+
+def find_downloaded_files(download_path: str):
+    downloaded_files = {}
+
+    for dirpath, _, filenames in os.walk(download_path):
+        for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
+            downloaded_files[os.path.relpath(file_path, download_path)] = file_path
+
+    return downloaded_files
+
+
+def verify_release_files(release, download_path: str, jobs: int):
+    # The same filename can be listed twice, once for standard and once for .NET builds.
+    expected_checksums = {}
+    for file in release.files:
+        expected_checksums.setdefault(file.filename, []).append(file.checksum)
+
+    summary = {
+        "release": release.name,
+        "verified": [],
+        "mismatched": [],
+        "unreadable": [],
+        "missing": [],
+        "extra": [],
+    }
+
+    checked_files = {}
+    for relative_path, file_path in sorted(find_downloaded_files(download_path).items()):
+        filename = os.path.basename(relative_path)
+        if filename in expected_checksums:
+            checked_files[relative_path] = file_path
+        elif filename not in IGNORED_FILENAMES:
+            summary["extra"].append(relative_path)
+
+    found_filenames = set(os.path.basename(relative_path) for relative_path in checked_files)
+    summary["missing"] = sorted(filename for filename in expected_checksums if filename not in found_filenames)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for relative_path, file_path in checked_files.items():
+            futures[relative_path] = executor.submit(compute_file_checksum, file_path, VERIFY_CHUNK_SIZE)
+
+        for relative_path, future in futures.items():
+            try:
+                checksum = future.result()
+            except OSError as e:
+                # E.g. the file was deleted or its permissions changed since it was listed.
+                summary["unreadable"].append({
+                    "filename": relative_path,
+                    "error": e.strerror or str(e),
+                })
+                continue
+
+            expected = expected_checksums[os.path.basename(relative_path)]
+            if checksum in expected:
+                summary["verified"].append(relative_path)
+            else:
+                summary["mismatched"].append({
+                    "filename": relative_path,
+                    "expected": expected,
+                    "actual": checksum,
+                })
+
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--release", default="", help="Release to verify files of, e.g. 4.3-stable or 4.4-beta1.")
+    parser.add_argument("-d", "--dir", default="", help="Directory with downloaded release files.")
+    parser.add_argument("--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+    parser.add_argument("-j", "--jobs", type=int, default=min(32, (os.cpu_count() or 1) * 2), help="Number of files hashed in parallel (defaults to twice the number of CPUs, up to 32).")
+    parser.add_argument("--json", action="store_true", help="Print a machine-readable summary in JSON format.")
+    args = parser.parse_args()
+
+    if args.release == "" or args.dir == "":
+        print("Failed to verify release files: Release name and download directory cannot be empty.\n")
+        parser.print_help()
+        exit(1)
+
+    release_path = get_release_path(args.releases, args.release)
+    if not os.path.isfile(release_path):
+        print(f"Failed to verify release files: Cannot find release metadata at '{release_path}'.\n")
+        exit(1)
+    if not os.path.isdir(args.dir):
+        print(f"Failed to verify release files: Cannot find the download directory at '{args.dir}'.\n")
+        exit(1)
+
+    summary = verify_release_files(load_release(release_path), args.dir, args.jobs)
+    success = not summary["mismatched"] and not summary["unreadable"] and not summary["missing"]
+
+    if args.json:
+        summary["success"] = success
+        print(json.dumps(summary, indent=4))
+    else:
+        for file in summary["mismatched"]:
+            print(f"MISMATCH: {file['filename']}")
+        for file in summary["unreadable"]:
+            print(f"UNREADABLE: {file['filename']}: {file['error']}")
+        for filename in summary["missing"]:
+            print(f"MISSING: {filename}")
+        for filename in summary["extra"]:
+            print(f"EXTRA: {filename}")
+
+        print(
+            f"Verified {len(summary['verified'])} files of release '{summary['release']}': "
+            f"{len(summary['mismatched'])} mismatched, {len(summary['unreadable'])} unreadable, {len(summary['missing'])} missing, {len(summary['extra'])} extra."
+        )
+
+    if not success:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
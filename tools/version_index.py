@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+### Build and query a sorted index of all release versions.
+###
+### Releases are ordered by version, then by status (dev < alpha < beta <
+### rc < stable) and its number, as defined by ReleaseVersion. The index
+### keeps the sort keys in a flat list, and those of stable releases in
+### another, so range, predecessor and successor queries are binary
+### searches. The latest release and the latest stable
+### release of each branch are precomputed when the index is built.
+###
+### The index is saved as a JSON file with releases already in order, so
+### loading it doesn't need to read any release metadata or sort anything.
+###
+### Usage: ./version_index.py build
+### Usage: ./version_index.py range --branch 4.3 --after 4.3-beta2 --prereleases
+### Usage: ./version_index.py latest --stable
+### Usage: ./version_index.py newer 4.2.1 --stable
+
+
+import argparse
+import bisect
+import json
+import os
+
+from release_loader import DEFAULT_RELEASES_PATH, load_releases
+from release_model import get_release_version, parse_release_name
+
+
+DEFAULT_INDEX_PATH = "./tmp/version-index.json"
+
+# Version of the index format, bump it when the layout changes.
+INDEX_FORMAT = 1
+
+
+def get_branch_bounds(branch: str):
+    # Version bits are compared first in sort keys, so a prefix of them bounds
+    # every release in the branch, e.g. 4.3 covers 4.3-dev1 through 4.3.5-stable.
+    branch_bits = get_release_version(branch).version_bits
+    return (branch_bits,), (branch_bits + (float("inf"),),)
+
+
+class VersionIndex:
+    def __init__(self, entries):
+        # Entries are (ReleaseVersion, release date) pairs in any order.
+        entries = sorted(entries, key=lambda x: x[0].sort_key)
+
+        self.versions = [release_version for release_version, _ in entries]
+        self.release_dates = [release_date for _, release_date in entries]
+        self.keys = [release_version.sort_key for release_version in self.versions]
+        self.stable_versions = [release_version for release_version in self.versions if release_version.is_stable]
+        self.stable_keys = [release_version.sort_key for release_version in self.stable_versions]
+
+        # Later entries win, so each branch ends up with its newest release.
+        self.latest = {}
+        self.latest_stable = {}
+        self.newest_stable = -1
+        for position, release_version in enumerate(self.versions):
+            self.latest[release_version.branch] = position
+            if release_version.is_stable:
+                self.latest_stable[release_version.branch] = position
+                self.newest_stable = position
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+    # Queries.
+
+    def find(self, release_version):
+        position = bisect.bisect_left(self.keys, release_version.sort_key)
+        if position < len(self.keys) and self.keys[position] == release_version.sort_key:
+            return position
+        return -1
+
+    def get_predecessor(self, release_version, stable_only: bool = False):
+        versions, keys = (self.stable_versions, self.stable_keys) if stable_only else (self.versions, self.keys)
+        position = bisect.bisect_left(keys, release_version.sort_key) - 1
+        return versions[position] if position >= 0 else None
+
+    def get_successor(self, release_version, stable_only: bool = False):
+        versions, keys = (self.stable_versions, self.stable_keys) if stable_only else (self.versions, self.keys)
+        position = bisect.bisect_right(keys, release_version.sort_key)
+        return versions[position] if position < len(versions) else None
+
+    def get_range(self, branch: str = "", after=None, before=None, stable: bool = False, prereleases: bool = False):
+        # Both after and before are exclusive bounds.
+        start = 0
+        end = len(self.keys)
+        if branch:
+            lower_key, upper_key = get_branch_bounds(branch)
+            start = bisect.bisect_left(self.keys, lower_key)
+            end = bisect.bisect_right(self.keys, upper_key)
+        if after is not None:
+            start = max(start, bisect.bisect_right(self.keys, after.sort_key))
+        if before is not None:
+            end = min(end, bisect.bisect_left(self.keys, before.sort_key))
+
+        versions = self.versions[start:end]
+        if stable:
+            versions = [release_version for release_version in versions if release_version.is_stable]
+        elif prereleases:
+            versions = [release_version for release_version in versions if not release_version.is_stable]
+
+        return versions
+
+    def get_latest(self, stable_only: bool = False):
+        if stable_only:
+            positions = self.latest_stable.values()
+        else:
+            positions = self.latest.values()
+
+        return [self.versions[position] for position in sorted(positions)]
+
+    def get_latest_in_branch(self, branch: str, stable_only: bool = False):
+        position = (self.latest_stable if stable_only else self.latest).get(branch)
+        return self.versions[position] if position is not None else None
+
+    def find_newer(self, release_version, stable_only: bool = False):
+        # The newest release overall, if it's newer than the given one.
+        if stable_only:
+            position = self.newest_stable
+        else:
+            position = len(self.versions) - 1
+
+        if position >= 0 and self.keys[position] > release_version.sort_key:
+            return self.versions[position]
+        return None
+
+    # Serialization.
+
+    def save(self, index_path: str) -> None:
+        index_data = {
+            "format": INDEX_FORMAT,
+            "releases": [[release_version.tag, release_date] for release_version, release_date in zip(self.versions, self.release_dates)],
+        }
+
+        index_dir = os.path.dirname(index_path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index_data, f, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+
+
+def build_index(releases_path: str) -> VersionIndex:
+    return VersionIndex((release.release_version, release.release_date) for release in load_releases(releases_path))
+
+
+def load_index(index_path: str) -> VersionIndex:
+    with open(index_path, 'r') as f:
+        index_data = json.load(f)
+
+    if index_data.get("format") != INDEX_FORMAT:
+        raise ValueError(f"File '{index_path}' has an unsupported index format.")
+
+    return VersionIndex((parse_release_name(tag), release_date) for tag, release_date in index_data["releases"])
+
+
+# Main routine.
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--index", default=DEFAULT_INDEX_PATH, help=f"Path to the version index (defaults to {DEFAULT_INDEX_PATH}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the version index from release metadata files.")
+    build_parser.add_argument("-r", "--releases", default=DEFAULT_RELEASES_PATH, help=f"Path to the folder with release metadata files (defaults to {DEFAULT_RELEASES_PATH}).")
+
+    range_parser = subparsers.add_parser("range", help="Print releases in a range, oldest first.")
+    range_parser.add_argument("-b", "--branch", default="", help="Only include releases of this branch, e.g. 4.3 or 4.")
+    range_parser.add_argument("--after", default="", help="Only include releases newer than this one, e.g. 4.3-beta2.")
+    range_parser.add_argument("--before", default="", help="Only include releases older than this one, e.g. 4.3-stable.")
+    range_filter = range_parser.add_mutually_exclusive_group()
+    range_filter.add_argument("--stable", action="store_true", help="Only include stable releases.")
+    range_filter.add_argument("--prereleases", action="store_true", help="Only include pre-releases.")
+
+    latest_parser = subparsers.add_parser("latest", help="Print the latest release of each branch.")
+    latest_parser.add_argument("--stable", action="store_true", help="Only consider stable releases.")
+
+    for command, command_help in [("prev", "Print the release preceding the given one."), ("next", "Print the release following the given one."), ("newer", "Print the newest release, if it's newer than the given one.")]:
+        command_parser = subparsers.add_parser(command, help=command_help)
+        command_parser.add_argument("name", help="Release name, e.g. 4.3-stable or 4.4-beta1.")
+        command_parser.add_argument("--stable", action="store_true", help="Only consider stable releases.")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = build_index(args.releases)
+        index.save(args.index)
+        print(f"Written version index with {len(index)} releases to '{args.index}'.")
+        return
+
+    if not os.path.isfile(args.index):
+        print(f"Failed to query version index: Cannot find the index at '{args.index}', build it first.\n")
+        exit(1)
+
+    try:
+        index = load_index(args.index)
+    except (OSError, ValueError) as e:
+        print(f"Failed to query version index: {e}\n")
+        exit(1)
+
+    if args.command == "range":
+        after = parse_release_name(args.after) if args.after else None
+        before = parse_release_name(args.before) if args.before else None
+        results = index.get_range(args.branch, after, before, args.stable, args.prereleases)
+    elif args.command == "latest":
+        results = index.get_latest(args.stable)
+    else:
+        release_version = parse_release_name(args.name)
+        if args.command == "prev":
+            result = index.get_predecessor(release_version, args.stable)
+        elif args.command == "next":
+            result = index.get_successor(release_version, args.stable)
+        else:
+            result = index.find_newer(release_version, args.stable)
+        results = [result] if result is not None else []
+
+    if not results:
+        print("No matching releases found in the version index.")
+        exit(1)
+
+    for release_version in results:
+        print(release_version.name)
+
+
+if __name__ == "__main__":
+    main()